@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Click-to-effect latency of `spotifyctl.py control`
+
+Fast path: a player state server on a temporary socket runs commands on a
+stub controller, latency is measured from spawning spotifyctl until the stub
+is called. Cold path: spotifyctl finds no server and connects to D-Bus and
+PulseAudio itself, latency is measured until it exits. The cold path needs
+a running Spotify, it is reported as unavailable otherwise.
+
+Usage: python3 -m benchmarks.control_latency [-n RUNS] [-c "CONTROL ARGUMENTS"]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from os import path
+from statistics import median
+from time import perf_counter
+
+from lib.ipc import PlayerStateServer
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+CHILD = """
+import runpy, sys
+sys.path.insert(0, {root!r})
+import lib.ipc
+lib.ipc.SOCKET_ADDRESS = {address!r}
+sys.argv = ["spotifyctl", "control", "--debug"] + {arguments!r}
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+class StubController:
+    def __init__(self):
+        self.called = None
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.called = perf_counter()
+        return command
+
+
+def spawn(address, arguments):
+    code = CHILD.format(root=ROOT, address=address, arguments=arguments, script=path.join(ROOT, "spotifyctl.py"))
+    return subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+def fast_path(arguments, runs):
+    address = path.join(tempfile.mkdtemp(prefix="spotifyctl-control-"), "socket")
+    controller = StubController()
+    server = PlayerStateServer(address, controller=controller)
+
+    latencies = []
+    try:
+        for _ in range(runs):
+            controller.called = None
+            start = perf_counter()
+            child = spawn(address, arguments)
+            while child.poll() is None:
+                server.process_events(0.001)
+            output = child.stdout.read().decode().strip()
+            if controller.called is None or not output == "":
+                raise Exception("fast path failed: " + output)
+            latencies.append(controller.called - start)
+    finally:
+        server.shutdown()
+    return latencies
+
+
+def cold_path(arguments, runs):
+    address = path.join(tempfile.mkdtemp(prefix="spotifyctl-control-"), "missing")
+
+    latencies = []
+    for _ in range(runs):
+        start = perf_counter()
+        child = spawn(address, arguments)
+        output = child.communicate()[0].decode().strip()
+        if not output == "":
+            return None, output.splitlines()[-1]
+        latencies.append(perf_counter() - start)
+    return latencies, None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--runs", type=int, default=10, help="number of runs per path")
+    parser.add_argument("-c", "--command", default="--play-pause", help="arguments of control, space separated")
+    args = parser.parse_args()
+
+    arguments = args.command.split()
+
+    fast = fast_path(arguments, args.runs)
+    print("fast path: {:7.1f} ms median, {:7.1f} ms max".format(median(fast) * 1e3, max(fast) * 1e3))
+
+    cold, error = cold_path(arguments, args.runs)
+    if cold is None:
+        print("cold path: unavailable ({})".format(error))
+    else:
+        print("cold path: {:7.1f} ms median, {:7.1f} ms max".format(median(cold) * 1e3, max(cold) * 1e3))
+        print("speedup:   {:.1f}x".format(median(cold) / median(fast)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Player state fetch latency against a local stand-in MPRIS service
+
+A private bus is started with Gio.TestDBus and a child process serves
+Spotify's player properties on it. PulseAudio is replaced by a stub which
+sleeps for the given delay, standing in for its round trip.
+
+The reference functions below are the fetch lib had before GetAll: a new
+proxy (which loads properties itself), two Properties.Get calls and then
+the volume, one after another. A cached SpotifyDBus is measured too, it
+should answer from its snapshot without any bus traffic.
+
+Usage: python3 -m benchmarks.dbus_fetch [-n NUMBER] [--pulse-delay MS]
+"""
+
+import argparse
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+from gi.repository import Gio, GLib
+
+from lib.dbus import BUS_NAME, OBJECT_PATH, PLAYER_INTERFACE, SpotifyDBus, create_metadata
+from lib.player import PlayerController
+from lib.playerinfo import PlayerState
+
+INTROSPECTION = """
+<node>
+  <interface name="org.mpris.MediaPlayer2.Player">
+    <property name="Metadata" type="a{sv}" access="read"/>
+    <property name="PlaybackStatus" type="s" access="read"/>
+  </interface>
+</node>
+"""
+
+METADATA = {
+    "mpris:trackid": GLib.Variant("s", "spotify:track:4uLU6hMCjMI75M1A2tKUQC"),
+    "mpris:length": GLib.Variant("x", 213000000),
+    "mpris:artUrl": GLib.Variant("s", "https://i.scdn.co/image/ab67616d0000b273"),
+    "xesam:album": GLib.Variant("s", "Whenever You Need Somebody"),
+    "xesam:albumArtist": GLib.Variant("as", ["Rick Astley"]),
+    "xesam:artist": GLib.Variant("as", ["Rick Astley"]),
+    "xesam:autoRating": GLib.Variant("d", 0.8),
+    "xesam:discNumber": GLib.Variant("i", 1),
+    "xesam:title": GLib.Variant("s", "Never Gonna Give You Up"),
+    "xesam:trackNumber": GLib.Variant("i", 1),
+    "xesam:url": GLib.Variant("s", "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC"),
+}
+
+CONNECTION_FLAGS = Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+
+
+class StubPulseAudio:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get_volume(self):
+        sleep(self.delay)
+        return 40
+
+
+def serve(address):
+    bus = Gio.DBusConnection.new_for_address_sync(address, CONNECTION_FLAGS, None, None)
+    interface_info = Gio.DBusNodeInfo.new_for_xml(INTROSPECTION).interfaces[0]
+    properties = {
+        "Metadata": GLib.Variant("a{sv}", METADATA),
+        "PlaybackStatus": GLib.Variant("s", "Playing"),
+    }
+
+    def get_property(connection, sender, object_path, interface_name, property_name):
+        return properties[property_name]
+
+    bus.register_object(OBJECT_PATH, interface_info, None, get_property, None)
+    Gio.bus_own_name_on_connection(bus, BUS_NAME, Gio.BusNameOwnerFlags.NONE, None, None)
+    GLib.MainLoop().run()
+
+
+def reference_get(proxy, name):
+    return proxy.call_sync(
+        "org.freedesktop.DBus.Properties.Get",
+        GLib.Variant("(ss)", (PLAYER_INTERFACE, name)),
+        Gio.DBusCallFlags.NONE,
+        -1,
+        None
+    )[0]
+
+
+def reference_proxy(bus):
+    return Gio.DBusProxy.new_sync(bus, Gio.DBusProxyFlags.NONE, None, BUS_NAME, OBJECT_PATH, PLAYER_INTERFACE, None)
+
+
+def reference_get_player_state(proxy, pulseaudio):
+    return PlayerState(
+        create_metadata(reference_get(proxy, "Metadata")),
+        reference_get(proxy, "PlaybackStatus"),
+        pulseaudio.get_volume()
+    )
+
+
+def wait_for_service(bus):
+    for _ in range(500):
+        owned = bus.call_sync(
+            "org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus", "NameHasOwner",
+            GLib.Variant("(s)", (BUS_NAME,)), None, Gio.DBusCallFlags.NONE, -1, None
+        )[0]
+        if owned:
+            return
+        sleep(0.01)
+    raise Exception("stand-in service did not start")
+
+
+def measure(function, number):
+    start = perf_counter()
+    for _ in range(number):
+        function()
+    return (perf_counter() - start) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=200, help="fetches per measurement")
+    parser.add_argument("--pulse-delay", type=float, default=1, help="PulseAudio round trip of the stub in ms")
+    parser.add_argument("--serve", metavar="ADDRESS", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve)
+        return
+
+    test_bus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
+    test_bus.up()
+    address = test_bus.get_bus_address()
+    service = subprocess.Popen([sys.executable, "-m", "benchmarks.dbus_fetch", "--serve", address])
+
+    try:
+        bus = Gio.DBusConnection.new_for_address_sync(address, CONNECTION_FLAGS, None, None)
+        wait_for_service(bus)
+
+        pulseaudio = StubPulseAudio(args.pulse_delay / 1000)
+        proxy = reference_proxy(bus)
+        player = PlayerController(pulseaudio, SpotifyDBus(bus))
+        cached_spotify = SpotifyDBus(bus, cache=True)
+        cached_player = PlayerController(pulseaudio, cached_spotify)
+
+        expected = reference_get_player_state(proxy, pulseaudio)
+        if not player.get_player_state() == expected or not cached_player.get_player_state() == expected:
+            print("error: player states differ")
+            sys.exit(1)
+
+        timings = (
+            ("reference, new proxy", measure(lambda: reference_get_player_state(reference_proxy(bus), pulseaudio),
+                                             args.number)),
+            ("reference", measure(lambda: reference_get_player_state(proxy, pulseaudio), args.number)),
+            ("GetAll + concurrent volume, new controller",
+             measure(lambda: PlayerController(pulseaudio, SpotifyDBus(bus)).get_player_state(), args.number)),
+            ("GetAll + concurrent volume", measure(player.get_player_state, args.number)),
+            ("cached", measure(cached_player.get_player_state, args.number)),
+        )
+
+        for name, seconds in timings:
+            print("{:44} {:8.3f} ms".format(name, seconds * 1e3))
+        print("round trips of cached reads: {} for {} fetches".format(cached_spotify.round_trips, args.number + 1))
+    finally:
+        service.terminate()
+        service.wait()
+        test_bus.down()
+
+
+if __name__ == "__main__":
+    main()
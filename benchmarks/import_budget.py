@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Import budget of `spotifyctl.py info` while a player state server runs
+
+A thin client should load only the socket layer: no parser, title cleaner,
+cache database or D-Bus/PulseAudio bindings. Each run starts spotifyctl in a
+child process against a server on a temporary socket. When the first line is
+printed, the child reports the modules it imported, its peak RSS and exits.
+
+Exits with status 1 if a forbidden module is imported or a target is missed.
+
+Usage: python3 -m benchmarks.import_budget [-n RUNS] [--max-rss MiB] [--max-time SECONDS]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import threading
+from os import path
+from statistics import median
+from time import perf_counter
+
+from lib.ipc import PlayerStateServer
+from lib.playerinfo import Metadata, PlayerState
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+FORBIDDEN = (
+    "lib.cache",
+    "lib.dbus",
+    "lib.player",
+    "lib.pulseaudio",
+    "lib.title",
+    "lib.xformat",
+    "concurrent",
+    "csv",
+    "json",
+    "sqlite3",
+)
+
+CHILD = """
+import os, resource, runpy, sys
+
+before = set(sys.modules)
+
+class Report:
+    def write(self, data):
+        modules = sorted(set(sys.modules) - before)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(1, ("{{}}\\n".format(rss) + "\\n".join(modules) + "\\n").encode())
+        os._exit(0)
+
+    def flush(self):
+        pass
+
+sys.path.insert(0, {root!r})
+import lib.ipc
+lib.ipc.SOCKET_ADDRESS = {address!r}
+sys.argv = ["spotifyctl", "info"]
+sys.stdout = Report()
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+def run_client(address):
+    code = CHILD.format(root=ROOT, address=address, script=path.join(ROOT, "spotifyctl.py"))
+
+    start = perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, timeout=30, check=True).stdout
+    elapsed = perf_counter() - start
+
+    lines = output.decode().splitlines()
+    return elapsed, int(lines[0]) / 1024, lines[1:]
+
+
+def violations(modules):
+    stdlib = getattr(sys, "stdlib_module_names", None)
+    found = []
+    for module in modules:
+        top = module.split(".")[0]
+        if any(module == name or module.startswith(name + ".") for name in FORBIDDEN):
+            found.append(module)
+        elif stdlib is not None and top not in stdlib and top not in ("lib", "plugins"):
+            found.append(module)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--runs", type=int, default=5, help="number of client runs")
+    parser.add_argument("--max-rss", type=float, default=20, help="peak RSS target of a client in MiB")
+    parser.add_argument("--max-time", type=float, default=0.15, help="median time to first line target in seconds")
+    args = parser.parse_args()
+
+    address = path.join(tempfile.mkdtemp(prefix="spotifyctl-budget-"), "socket")
+    server = PlayerStateServer(address, renderer=lambda subscription, player_state: player_state.metadata.title)
+    server.send(PlayerState(Metadata(title="Madman", artist=["Ashbury"]), "Playing", 40))
+
+    stopped = threading.Event()
+
+    def serve():
+        while not stopped.is_set():
+            server.process_events(0.01)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+
+    try:
+        results = [run_client(address) for _ in range(args.runs)]
+    finally:
+        stopped.set()
+        thread.join()
+        server.shutdown()
+
+    start = perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter = perf_counter() - start
+
+    elapsed = median(result[0] for result in results)
+    rss = max(result[1] for result in results)
+    modules = results[-1][2]
+    found = violations(modules)
+
+    print("modules imported: {}".format(len(modules)))
+    print("time to first line: {:.1f} ms (median, interpreter alone {:.1f} ms, target {:.0f} ms)".format(
+        elapsed * 1e3, interpreter * 1e3, args.max_time * 1e3))
+    print("peak rss: {:.1f} MiB (target {:.1f} MiB)".format(rss, args.max_rss))
+
+    failed = False
+    if len(found) > 0:
+        print("budget exceeded, imported: " + ", ".join(found))
+        failed = True
+    if elapsed > args.max_time:
+        print("time target missed")
+        failed = True
+    if rss > args.max_rss:
+        print("rss target missed")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
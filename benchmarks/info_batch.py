@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Throughput of Info.format_many against rendering one state per call
+
+Usage: python3 -m benchmarks.info_batch [-n NUMBER]
+"""
+
+import argparse
+from time import perf_counter
+
+from lib.playerinfo import Metadata, PlayerState
+from lib.title import clean as clean_title
+from lib.xformat import XFormat
+from plugins.info import Info
+
+FORMAT = "$icon $artist — $clean_title{ // ${volume}%| @IfNotNone 'volume'}"
+
+TITLES = [
+    "Madman",
+    "Wish You Were Here - 2011 Remastered Version",
+    "Heroes - 2017 Remaster",
+    "Karma Police (Live at Glastonbury)",
+    "Clair de Lune, L. 32 (Recorded at Abbey Road)"
+]
+
+
+def create_player_states(number):
+    return [
+        PlayerState(
+            Metadata(
+                trackid="spotify:track:" + str(i),
+                title=TITLES[i % len(TITLES)],
+                artist=["Artist " + str(i % 7)],
+                album_artist=["Artist " + str(i % 7)]
+            ),
+            "Playing" if i % 3 else "Paused",
+            None if i % 5 == 0 else i % 101
+        )
+        for i in range(number)
+    ]
+
+
+def measure(function):
+    start = perf_counter()
+    function()
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=10000, help="number of player states")
+    args = parser.parse_args()
+
+    subparsers = argparse.ArgumentParser().add_subparsers()
+    info = Info(subparsers)
+    formatter = XFormat(parser="lalr")
+    resolvers = info._create_resolvers(clean_title, chr(0xe099), chr(0xe058))
+    player_states = create_player_states(args.number)
+
+    def per_call():
+        renderers = dict()
+        for player_state in player_states:
+            info._format(formatter, resolvers, FORMAT, player_state, renderers, FORMAT)
+
+    def batch():
+        for _ in info.format_many(formatter, resolvers, FORMAT, player_states):
+            pass
+
+    for name, function in (("per call", per_call), ("format_many", batch)):
+        elapsed = measure(function)
+        print("{:12} {:10.0f} states/s".format(name, args.number / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Load test of PlayerStateServer with hundreds of connected receivers
+
+Receivers run in a child process, decode every frame and stop at the last
+state. One extra receiver never reads, the server should keep up with the
+others regardless and coalesce what is queued for it. Receivers which fall
+behind skip intermediate states, so fewer frames than broadcasts may arrive.
+
+Usage: python3 -m benchmarks.ipc_load [-c CLIENTS] [-n STATES]
+"""
+
+import argparse
+import selectors
+import socket
+import tempfile
+from multiprocessing import Pipe, Process
+from os import path
+from time import perf_counter
+
+from lib.ipc import PlayerStateServer
+from lib.playerinfo import Metadata, PlayerState
+from lib.protocol import FrameDecoder, FRAME_PLAYER_STATE, decode_player_state, apply_player_state_delta
+
+
+def receive(address, clients, last_state, pipe):
+    selector = selectors.DefaultSelector()
+    counts = {}
+    player_states = {}
+
+    stuck = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stuck.connect(address)
+
+    for _ in range(clients):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+        sock.setblocking(False)
+        decoder = FrameDecoder()
+        counts[sock] = 0
+        player_states[sock] = None
+        selector.register(sock, selectors.EVENT_READ, decoder)
+
+    pipe.send("connected")
+
+    done = 0
+    while done < clients:
+        for key, mask in selector.select(5):
+            decoder = key.data
+            if decoder.recv_from(key.fileobj) == 0:
+                pipe.send("closed")
+                return
+            frame = decoder.next_frame()
+            while frame is not None:
+                frame_type, payload = frame
+                if frame_type == FRAME_PLAYER_STATE:
+                    player_states[key.fileobj] = decode_player_state(payload)
+                else:
+                    player_states[key.fileobj] = apply_player_state_delta(player_states[key.fileobj], payload)
+                counts[key.fileobj] += 1
+                frame = decoder.next_frame()
+            if player_states[key.fileobj] == last_state:
+                selector.unregister(key.fileobj)
+                done += 1
+
+    pipe.send(sum(counts.values()))
+    pipe.recv()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--clients", type=int, default=300, help="number of receivers")
+    parser.add_argument("-n", "--states", type=int, default=1000, help="number of broadcasts")
+    args = parser.parse_args()
+
+    address = path.join(tempfile.mkdtemp(prefix="spotifyctl-bench-"), "socket")
+    server = PlayerStateServer(address)
+
+    states = [PlayerState(Metadata(trackid=str(i // 20), title="Madman", artist=["Ashbury"]), "Playing", i % 101)
+              for i in range(args.states)]
+
+    pipe, child_pipe = Pipe()
+    child = Process(target=receive, args=(address, args.clients, states[-1], child_pipe))
+    child.start()
+
+    while not pipe.poll():
+        server.process_events(0.01)
+    pipe.recv()
+    while len(server._clients) < args.clients + 1:
+        server.process_events(0.01)
+
+    slowest_send = 0
+    start = perf_counter()
+    for player_state in states:
+        send_start = perf_counter()
+        server.send(player_state)
+        slowest_send = max(slowest_send, perf_counter() - send_start)
+        server.process_events(0)
+    sent = perf_counter() - start
+
+    while not pipe.poll():
+        server.process_events(0.01)
+    received = pipe.recv()
+    elapsed = perf_counter() - start
+
+    stats = server.client_stats()
+    pipe.send("exit")
+    child.join()
+    server.shutdown()
+
+    expected = args.clients * args.states
+    print("receivers:      {} (+1 never reading)".format(args.clients))
+    print("frames:         {} of {} broadcast delivered".format(received, expected))
+    print("coalesced:      {} broadcasts, {} frames dropped (never reading: {}, {} bytes pending)".format(
+        sum(stat["coalesced"] for stat in stats), sum(stat["dropped"] for stat in stats),
+        max(stat["dropped"] for stat in stats), max(stat["pending"] for stat in stats)
+    ))
+    print("broadcasts:     {:.0f}/s while sending, {:.0f}/s until delivered".format(
+        args.states / sent, args.states / elapsed
+    ))
+    print("slowest send(): {:.2f} ms".format(slowest_send * 1e3))
+    print("serializations: {:.2f} per broadcast".format(server.serializations / server.broadcasts))
+    print("frame size:     {:.1f} bytes per broadcast".format(server.bytes_broadcast / server.broadcasts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Encode/decode cost and size of player state frames against pickle
+
+Delta rows encode a volume change against the previous state, the most
+common update while scrolling.
+
+Usage: python3 -m benchmarks.ipc_protocol [-n NUMBER]
+"""
+
+import argparse
+from dataclasses import replace
+from pickle import dumps, loads
+from timeit import timeit
+
+from lib.playerinfo import Metadata, PlayerState
+from lib.protocol import HEADER, encode_player_state, decode_player_state, encode_player_state_delta, \
+    apply_player_state_delta
+
+PLAYER_STATE = PlayerState(
+    Metadata(
+        "spotify:track:4uLU6hMCjMI75M1A2tKUQC",
+        213573000,
+        "https://i.scdn.co/image/ab67616d0000b273e319baafd16e84f0408af2a0",
+        "Whenever You Need Somebody",
+        ["Rick Astley"],
+        ["Rick Astley"],
+        0.75,
+        1,
+        "Never Gonna Give You Up",
+        1,
+        "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC"
+    ),
+    "Playing",
+    63
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=20000, help="iterations per measurement")
+    args = parser.parse_args()
+
+    pickled = dumps(PLAYER_STATE)
+    frame = encode_player_state(PLAYER_STATE)
+    payload = frame[HEADER.size:]
+    assert decode_player_state(payload) == PLAYER_STATE and loads(pickled) == PLAYER_STATE
+
+    louder = replace(PLAYER_STATE, volume=PLAYER_STATE.volume + 5)
+    delta = encode_player_state_delta(PLAYER_STATE, louder)
+    delta_payload = delta[HEADER.size:]
+    assert apply_player_state_delta(PLAYER_STATE, delta_payload) == louder
+
+    rows = (
+        ("pickle", len(pickled),
+         timeit(lambda: dumps(PLAYER_STATE), number=args.number),
+         timeit(lambda: loads(pickled), number=args.number)),
+        ("frame", len(frame),
+         timeit(lambda: encode_player_state(PLAYER_STATE), number=args.number),
+         timeit(lambda: decode_player_state(payload), number=args.number)),
+        ("delta", len(delta),
+         timeit(lambda: encode_player_state_delta(PLAYER_STATE, louder), number=args.number),
+         timeit(lambda: apply_player_state_delta(PLAYER_STATE, delta_payload), number=args.number))
+    )
+
+    print("{:8} {:>8} {:>12} {:>12}".format("", "bytes", "encode", "decode"))
+    for name, size, encode, decode in rows:
+        print("{:8} {:8d} {:9.2f} us {:9.2f} us".format(
+            name, size, encode / args.number * 1e6, decode / args.number * 1e6
+        ))
+
+
+if __name__ == "__main__":
+    main()
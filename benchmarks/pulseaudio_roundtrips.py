@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""PulseAudio round trips per volume operation against a stubbed backend
+
+The stub serves a number of sink inputs, Spotify's being the last one, and
+counts requests and sink inputs it returns. The reference functions below
+are what PulseAudioController did before caching the sink input: a full
+sink_input_list scan before every operation, twice for relative changes.
+
+If pulsectl or libpulse is missing, a minimal pulsectl module is installed
+in its place, so the check runs anywhere. Exits with status 1 if the
+controller's round trips differ from the requests the stub received.
+
+Usage: python3 -m benchmarks.pulseaudio_roundtrips [-s STREAMS] [-n OPERATIONS]
+"""
+
+import argparse
+import sys
+import types
+
+try:
+    import pulsectl
+except (ImportError, OSError):
+    pulsectl = types.ModuleType("pulsectl")
+    pulsectl.PulseIndexError = type("PulseIndexError", (Exception,), {})
+    sys.modules["pulsectl"] = pulsectl
+
+from lib.pulseaudio import PulseAudioController
+
+
+class StubVolume:
+    def __init__(self, value_flat):
+        self.value_flat = value_flat
+
+
+class StubSinkInput:
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.volume = StubVolume(0.5)
+        self.mute = 0
+
+
+class StubPulse:
+    def __init__(self, streams):
+        self.sink_inputs = {index: StubSinkInput(index, "stream {}".format(index)) for index in range(streams - 1)}
+        self.sink_inputs[streams - 1] = StubSinkInput(streams - 1, "Spotify")
+        self.requests = 0
+        self.transferred = 0
+
+    def sink_input_list(self):
+        self.requests += 1
+        self.transferred += len(self.sink_inputs)
+        return list(self.sink_inputs.values())
+
+    def sink_input_info(self, index):
+        self.requests += 1
+        if index not in self.sink_inputs:
+            raise pulsectl.PulseIndexError(index)
+        self.transferred += 1
+        return self.sink_inputs[index]
+
+    def volume_set(self, sink_input, volume):
+        self.requests += 1
+        self.sink_inputs[sink_input.index].volume = volume
+
+    def mute(self, sink_input, mute):
+        self.requests += 1
+        self.sink_inputs[sink_input.index].mute = int(mute)
+
+    def restart_spotify(self):
+        index = max(self.sink_inputs) + 1
+        for sink_input in list(self.sink_inputs.values()):
+            if sink_input.name == "Spotify":
+                del self.sink_inputs[sink_input.index]
+        self.sink_inputs[index] = StubSinkInput(index, "Spotify")
+
+
+def reference_find(pulse):
+    for sink_input in pulse.sink_input_list():
+        if sink_input.name == "Spotify":
+            return sink_input
+
+
+def reference_increase_volume(pulse, number):
+    volume = round(reference_find(pulse).volume.value_flat * 100)
+    sink_input = reference_find(pulse)
+    sink_input.volume.value_flat = min(volume + number, 100) / 100
+    pulse.volume_set(sink_input, sink_input.volume)
+
+
+def count(pulse, operation, number):
+    requests, transferred = pulse.requests, pulse.transferred
+    for _ in range(number):
+        operation()
+    return (pulse.requests - requests) / number, (pulse.transferred - transferred) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--streams", type=int, default=40, help="number of sink inputs")
+    parser.add_argument("-n", "--number", type=int, default=100, help="operations per measurement")
+    args = parser.parse_args()
+
+    reference_pulse = StubPulse(args.streams)
+    pulse = StubPulse(args.streams)
+    controller = PulseAudioController(pulse)
+
+    rows = [
+        ("reference increase_volume", count(reference_pulse, lambda: reference_increase_volume(reference_pulse, 0),
+                                            args.number)),
+        ("increase_volume", count(pulse, lambda: controller.increase_volume(0), args.number)),
+        ("get_volume", count(pulse, controller.get_volume, args.number)),
+        ("mute_unmute", count(pulse, controller.mute_unmute, args.number)),
+    ]
+
+    pulse.restart_spotify()
+    rows.append(("increase_volume, sink input replaced", count(pulse, lambda: controller.increase_volume(0), 1)))
+
+    for name, (requests, transferred) in rows:
+        print("{:38} {:5.2f} round trips {:6.2f} sink inputs per operation".format(name, requests, transferred))
+
+    if not controller.round_trips == pulse.requests:
+        print("error: controller counted {} round trips, backend served {}".format(controller.round_trips, pulse.requests))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
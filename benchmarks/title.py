@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Golden-output check and timings of lib.title on a corpus of real-world titles
+
+Cleaned titles are compared with benchmarks/data/titles.golden.txt first,
+the script exits with status 1 if any of them drifted. After an intended
+change of results, regenerate the golden file with --update-golden.
+
+Usage: python3 -m benchmarks.title [-n NUMBER] [--update-golden]
+"""
+
+import argparse
+import sys
+from os import path
+from time import perf_counter
+
+from lib.title import clean, tokenize, fractionate, defragment, ratio_test, phrase_test
+
+DATA_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), "data")
+CORPUS_PATH = path.join(DATA_DIRECTORY, "titles.txt")
+GOLDEN_PATH = path.join(DATA_DIRECTORY, "titles.golden.txt")
+
+
+def read_lines(filename):
+    with open(filename, encoding="utf-8") as file:
+        return [line.rstrip("\n") for line in file]
+
+
+def check_golden(titles):
+    expected = read_lines(GOLDEN_PATH)
+    if not len(expected) == len(titles):
+        print("golden: corpus has {} titles, golden file has {}".format(len(titles), len(expected)))
+        return False
+
+    drifted = [(title, golden, clean(title)) for title, golden in zip(titles, expected) if not clean(title) == golden]
+    for title, golden, cleaned in drifted:
+        print("golden: {!r}\n    expected {!r}\n    got      {!r}".format(title, golden, cleaned))
+    print("golden: {} of {} titles match".format(len(titles) - len(drifted), len(titles)))
+
+    return len(drifted) == 0
+
+
+def update_golden(titles):
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as file:
+        file.writelines(clean(title) + "\n" for title in titles)
+    print("golden: wrote {} titles to {}".format(len(titles), GOLDEN_PATH))
+
+
+def measure(function, inputs, number):
+    start = perf_counter()
+    for _ in range(number):
+        for item in inputs:
+            function(item)
+    return (perf_counter() - start) / (number * len(inputs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=50, help="passes over the corpus per measurement")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite golden file with current results")
+    args = parser.parse_args()
+
+    titles = read_lines(CORPUS_PATH)
+
+    if args.update_golden:
+        update_golden(titles)
+        return
+
+    if not check_golden(titles):
+        sys.exit(1)
+
+    tokenized = [tokenize(title) for title in titles]
+    groups = [group for tokens in tokenized for group in fractionate(tokens)]
+
+    timings = (
+        ("tokenize", measure(tokenize, titles, args.number), "title"),
+        ("fractionate", measure(fractionate, tokenized, args.number), "title"),
+        ("defragment", measure(defragment, tokenized, args.number), "title"),
+        ("ratio_test", measure(lambda group: ratio_test(group, 0.5), groups, args.number), "group"),
+        ("phrase_test", measure(phrase_test, groups, args.number), "group"),
+        ("clean", measure(clean, titles, args.number), "title"),
+    )
+
+    for name, seconds, unit in timings:
+        print("{:12} {:8.2f} us/{}".format(name, seconds * 1e6, unit))
+    print("clean throughput: {:.0f} titles/s".format(1 / timings[-1][1]))
+
+
+if __name__ == "__main__":
+    main()
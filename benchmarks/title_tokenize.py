@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Single-pass tokenizer of lib.title against the char-by-char reference
+
+The reference functions below are the implementation lib.title had before
+the regex based scanner. Outputs of both are compared before timing.
+
+Usage: python3 -m benchmarks.title_tokenize [-n NUMBER]
+"""
+
+import argparse
+from re import sub as replace
+from timeit import timeit
+
+from lib.title import tokenize, fractionate, defragment
+
+TITLES = [
+    "Symphony No. 9 in D Minor, Op. 125 \"Choral\": IV. Presto - Allegro assai (Live at Musikverein, Vienna / 1963) [2014 Remastered Version]",
+    "Goldberg Variations, BWV 988: Aria da capo (1981 Digital Recording) - Remastered 2015 / Recorded at CBS 30th Street Studio, New York",
+    "Die Zauberflöte, K. 620, Act II: \"Der Hölle Rache kocht in meinem Herzen\" (Königin der Nacht) [Live from Salzburg Festival, 1964]",
+    "Piano Concerto No. 2 in C Minor, Op. 18: I. Moderato - Allegro (Recorded in Philadelphia, 1/2/1929) {Anniversary Edition}",
+]
+
+
+def reference_tokenize(text):
+    tokenized = []
+    chunk = ""
+
+    for char in text:
+        if char in " ":
+            if not chunk == "":
+                tokenized.append(chunk)
+                chunk = ""
+        elif char in "([{":
+            tokenized.append(char)
+        elif char in "/}])":
+            if not chunk == "":
+                tokenized.append(chunk)
+            tokenized.append(char)
+            chunk = ""
+        else:
+            chunk += char
+    if not chunk == "":
+        tokenized.append(chunk)
+
+    return tokenized
+
+
+def reference_fractionate(tokenized):
+    fractions = []
+    chunk = []
+
+    for token in tokenized:
+        if token in "([{":
+            if not len(chunk) == 0:
+                fractions.append(chunk)
+                chunk = []
+            chunk.append(token)
+        elif token in "/-" and len(chunk) > 0 and not chunk[0] in "([{":
+            fractions.append(chunk)
+            chunk = list()
+            chunk.append(token)
+        elif token in "}])":
+            chunk.append(token)
+            if not len(chunk) == 0:
+                fractions.append(chunk)
+            chunk = []
+        else:
+            chunk.append(token)
+    if not len(chunk) == 0:
+        fractions.append(chunk)
+
+    return fractions
+
+
+def reference_defragment(tokenized):
+    title = ""
+    for token in tokenized:
+        if token in "([{":
+            title += token
+        elif token in "}])":
+            title = title[:-1] + token + " "
+        else:
+            title += token + " "
+    return replace(r"(?<=\d)( \/ )(?=\d)", "/", title[:-1])
+
+
+def reference_pipeline(title):
+    tokenized = reference_tokenize(title)
+    return reference_defragment([token for group in reference_fractionate(tokenized) for token in group])
+
+
+def pipeline(title):
+    return defragment([token for group in fractionate(tokenize(title)) for token in group])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=5000, help="iterations per measurement")
+    args = parser.parse_args()
+
+    for title in TITLES:
+        tokenized = reference_tokenize(title)
+        assert tokenize(title) == tokenized, title
+        assert fractionate(tokenized) == reference_fractionate(tokenized), title
+        assert defragment(tokenized) == reference_defragment(tokenized), title
+
+    for name, reference, current in (("tokenize", reference_tokenize, tokenize),
+                                     ("tokenize+fractionate+defragment", reference_pipeline, pipeline)):
+        before = timeit(lambda: [reference(title) for title in TITLES], number=args.number)
+        after = timeit(lambda: [current(title) for title in TITLES], number=args.number)
+        per_title = args.number * len(TITLES)
+        print("{:32} {:8.2f} us -> {:8.2f} us per title ({:.1f}x)".format(
+            name, before / per_title * 1e6, after / per_title * 1e6, before / after
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Coalescing of rapid relative volume changes
+
+Cross-process: NOTCHES processes start at once, like control -i per scroll
+notch, and push +1 to a VolumeQueue in a temporary directory. The applier
+appends each sum it applies to a log instead of writing to PulseAudio.
+In-process: a VolumeAccumulator gets the same notches, its flush is run when
+scheduled. In both, the applied sum must equal the number of notches.
+
+Usage: python3 -m benchmarks.volume_coalesce [-n NOTCHES] [-w WINDOW]
+"""
+
+import argparse
+import sys
+import tempfile
+from multiprocessing import Barrier, Process
+from os import path
+from time import perf_counter
+
+from lib.volume import VolumeAccumulator, VolumeQueue
+
+
+def notch(directory, window, barrier):
+    log = path.join(directory, "applied.log")
+
+    def apply(total):
+        with open(log, "a") as file:
+            file.write("{}\n".format(total))
+
+    barrier.wait()
+    VolumeQueue(directory, window).push(1, apply)
+
+
+def cross_process(notches, window):
+    directory = tempfile.mkdtemp(prefix="spotifyctl-volume-")
+    barrier = Barrier(notches)
+    processes = [Process(target=notch, args=(directory, window, barrier)) for _ in range(notches)]
+
+    start = perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = perf_counter() - start
+
+    with open(path.join(directory, "applied.log")) as file:
+        writes = [int(line) for line in file]
+    return writes, elapsed
+
+
+def in_process(notches, window):
+    writes = []
+    scheduled = []
+    accumulator = VolumeAccumulator(writes.append, window, lambda delay, callback: scheduled.append(callback))
+
+    for _ in range(notches):
+        accumulator.add(1)
+    while scheduled:
+        scheduled.pop(0)()
+    return writes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--notches", type=int, default=20, help="number of concurrent changes")
+    parser.add_argument("-w", "--window", type=float, default=0.05, help="coalescing window in seconds")
+    args = parser.parse_args()
+
+    writes, elapsed = cross_process(args.notches, args.window)
+    print("cross-process: {} notches, {} writes {}, {:.0f} ms until all processes exited".format(
+        args.notches, len(writes), writes, elapsed * 1e3))
+
+    accumulated = in_process(args.notches, args.window)
+    print("in-process:    {} notches, {} writes {}".format(args.notches, len(accumulated), accumulated))
+
+    if not sum(writes) == args.notches or not sum(accumulated) == args.notches:
+        print("error: steps were lost")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
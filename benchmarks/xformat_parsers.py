@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Renders format strings with the Earley and the LALR parser and compares them
+
+Both parsers must read the grammar the same way, otherwise switching the
+parser of `info` would change its output. The format strings below cover
+variables next to punctuation, escapes and lone `$` and `@` signs.
+
+Exits with status 1 if any output differs.
+
+Usage: python3 -m benchmarks.xformat_parsers
+"""
+
+import sys
+
+from lib.xformat import XFormat
+
+FORMATS = (
+    "$icon $artist — $clean_title{ // ${volume}%| @IfNotNone 'volume'}",
+    "$artist: $title",
+    "$title!",
+    "$a,$b",
+    "$artist-$title",
+    "$artist - $title",
+    "x$a",
+    "${a}b",
+    "$$a",
+    "$${a}",
+    "@@x",
+    "x@@y",
+    "user@host",
+    "50$",
+    "$5",
+    "${5}",
+    "{a {$b}}",
+    "{$a@b| @IfNotNone 'a'}",
+    "{$title| @Truncate '3'}",
+)
+
+VARIABLES = {
+    "icon": chr(0xe099),
+    "artist": "Ashbury",
+    "title": "Madman",
+    "clean_title": "Madman",
+    "volume": 63,
+    "a": 1,
+    "b": 2
+}
+
+FUNCTIONS = {
+    "@IfNotNone": lambda content, args_: "" if VARIABLES.get(args_[0], None) is None else content,
+    "@Truncate": lambda content, args_: content[:args_[0]]
+}
+
+
+def main():
+    earley = XFormat()
+    lalr = XFormat(parser="lalr")
+
+    differences = 0
+    for format_ in FORMATS:
+        expected = earley.format(format_, VARIABLES, FUNCTIONS)
+        result = lalr.format(format_, VARIABLES, FUNCTIONS)
+        if not result == expected:
+            differences += 1
+            print("differs: {!r} earley {!r} lalr {!r}".format(format_, expected, result))
+
+    print("{} of {} format strings render alike".format(len(FORMATS) - differences, len(FORMATS)))
+    if differences > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Per-render cost of XFormat: parsing every call vs. rendering a compiled template
+
+The incremental case changes only $volume between renders, like a volume
+scroll burst, and re-renders through TemplateRenderer.update.
+
+Usage: python3 -m benchmarks.xformat_render [-n NUMBER]
+"""
+
+import argparse
+from timeit import timeit
+
+from lib.xformat import XFormat
+
+FORMAT = "$icon $artist — $clean_title{ // ${volume}%| @IfNotNone 'volume'}"
+
+VARIABLES = {
+    "icon": chr(0xe099),
+    "artist": "Ashbury",
+    "clean_title": "Madman",
+    "volume": 63
+}
+
+FUNCTIONS = {
+    "@IfNotNone": lambda content, args_: "" if VARIABLES.get(args_[0], None) is None else content,
+    "@Truncate": lambda content, args_: content[:args_[0]]
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=2000, help="renders per measurement")
+    args = parser.parse_args()
+
+    formatter = XFormat()
+
+    def parse_and_render():
+        formatter.list_to_str(formatter.tree_to_list(formatter.parse(FORMAT), VARIABLES, FUNCTIONS))
+
+    def render_compiled():
+        formatter.compile(FORMAT).render(VARIABLES, FUNCTIONS)
+
+    volumes = iter(range(args.number * 2))
+    renderer = formatter.compile(FORMAT).renderer()
+
+    def render_incremental():
+        VARIABLES["volume"] = next(volumes)
+        renderer.update(VARIABLES, FUNCTIONS)
+
+    parsed = timeit(parse_and_render, number=args.number) / args.number
+    compiled = timeit(render_compiled, number=args.number) / args.number
+    incremental = timeit(render_incremental, number=args.number) / args.number
+
+    print("parse + render:    {:10.2f} us/render".format(parsed * 1e6))
+    print("compiled template: {:10.2f} us/render".format(compiled * 1e6))
+    print("incremental:       {:10.2f} us/render".format(incremental * 1e6))
+    print("speedup:           {:10.1f}x compiled, {:.1f}x incremental".format(parsed / compiled, parsed / incremental))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Startup cost of XFormat in a fresh interpreter
+
+Compares the Earley parser with the LALR parser loaded from the user cache
+directory, both on a cold cache (tables built and written) and a warm one.
+Every run happens in its own process, like a polybar client launch.
+
+Usage: python3 -m benchmarks.xformat_startup [-n NUMBER]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from os import environ, path
+from shutil import rmtree
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+SNIPPET = """
+from time import perf_counter
+start = perf_counter()
+from lib.xformat import XFormat
+XFormat(parser={parser!r}).compile("$icon $artist — $clean_title{{ // ${{volume}}%| @IfNotNone 'volume'}}")
+print(perf_counter() - start)
+"""
+
+
+def run(parser, cache_home):
+    env = dict(environ, XDG_CACHE_HOME=cache_home)
+    output = subprocess.check_output(
+        [sys.executable, "-c", SNIPPET.format(parser=parser)],
+        cwd=ROOT, env=env
+    )
+    return float(output)
+
+
+def measure(parser, number, cold):
+    cache_home = tempfile.mkdtemp(prefix="spotifyctl-bench-")
+    try:
+        timings = []
+        for _ in range(number):
+            if cold:
+                rmtree(cache_home, ignore_errors=True)
+            timings.append(run(parser, cache_home))
+        return min(timings), sum(timings) / len(timings)
+    finally:
+        rmtree(cache_home, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=10, help="processes per measurement")
+    args = parser.parse_args()
+
+    for name, parser_, cold in (("earley", "earley", True),
+                                ("lalr (cold cache)", "lalr", True),
+                                ("lalr (warm cache)", "lalr", False)):
+        best, mean = measure(parser_, args.number, cold)
+        print("{:18} best {:8.2f} ms   mean {:8.2f} ms".format(name, best * 1e3, mean * 1e3))
+
+
+if __name__ == "__main__":
+    main()
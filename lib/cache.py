@@ -0,0 +1,22 @@
+from os import environ, path, makedirs
+
+CACHE_DIRECTORY = path.join(environ.get("XDG_CACHE_HOME") or path.expanduser("~/.cache"), "spotifyctl")
+
+
+def cache_path(filename):
+    """Returns path of a file in the user cache directory
+
+    The directory is created if it does not exist. Callers should still expect
+    the file itself to be unwritable (read-only home, sandbox...).
+
+    Arguments:
+        filename {str} -- File name
+
+    Returns:
+        str -- Absolute path of the file
+    """
+    try:
+        makedirs(CACHE_DIRECTORY, exist_ok=True)
+    except OSError:
+        pass
+    return path.join(CACHE_DIRECTORY, filename)
@@ -2,27 +2,151 @@ from gi.repository import Gio, GLib
 from .playerinfo import Metadata
 from .exceptions import SpotifyIsNotRunningError
 
+BUS_NAME = "org.mpris.MediaPlayer2.spotify"
+OBJECT_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+
+
+def create_metadata(metadata):
+    """Creates Metadata from the MPRIS metadata dict
+
+    Arguments:
+        metadata {dict} -- Value of the Metadata property
+
+    Returns:
+        Metadata -- Metadata
+    """
+    return Metadata(
+        metadata["mpris:trackid"],
+        metadata["mpris:length"],
+        metadata["mpris:artUrl"],
+        metadata["xesam:album"],
+        metadata["xesam:albumArtist"],
+        metadata["xesam:artist"],
+        metadata["xesam:autoRating"],
+        metadata["xesam:discNumber"],
+        metadata["xesam:title"],
+        metadata["xesam:trackNumber"],
+        metadata["xesam:url"]
+    )
+
+
+def _translate_error(err):
+    if err.domain == "g-dbus-error-quark" and err.code == 2:
+        return SpotifyIsNotRunningError()
+    return err
+
+
+class PendingCall:
+    """Reply of an asynchronous D-Bus call
+
+    Replies are dispatched by the main context of the calling thread. With a
+    running main loop pass a callback, it is called with the result and the
+    error (one of them is None). Without one, `result` iterates the context
+    until the reply arrives, so other work can be done while it is in flight.
+
+    Keyword Arguments:
+        transform {function} -- Converts the reply variant to the result (default: {None})
+        callback {function} -- Called with result and error when the reply arrives (default: {None})
+    """
+
+    def __init__(self, transform=None, callback=None):
+        self._transform = transform
+        self._callback = callback
+        self._context = GLib.MainContext.get_thread_default() or GLib.MainContext.default()
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        while not self._done:
+            self._context.iteration(True)
+
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _resolve(self, value):
+        self._value = value
+        self._done = True
+
+        if self._callback is not None:
+            GLib.idle_add(self._notify)
+
+    def _notify(self):
+        self._callback(self._value, self._error)
+        return False
+
+    def _on_reply(self, source, async_result, user_data):
+        try:
+            reply = source.call_finish(async_result)
+            self._value = reply if self._transform is None else self._transform(reply)
+        except GLib.GError as err:
+            self._error = _translate_error(err)
+        self._done = True
+
+        if self._callback is not None:
+            self._callback(self._value, self._error)
+
 
 class SpotifyDBus:
     """Sends MPRIS signals to Spotify through DBus
 
         MPRIS specification: https://specifications.freedesktop.org/mpris-spec/latest/
+
+        Methods are called on the bus directly instead of through a proxy,
+        which would cost round trips to look up the name owner and load
+        properties when it is created.
+
+        With cache enabled, player properties are fetched once and then kept
+        up to date by PropertiesChanged signals, so reads do not go over the
+        bus. The snapshot is dropped when Spotify starts or quits. Signals are
+        dispatched by the main context, so use it only with a running main
+        loop; otherwise the snapshot would never be updated.
+
+        Keyword Arguments:
+            bus {Gio.DBusConnection} -- Session bus to share, None to connect (default: {None})
+            cache {bool} -- Serve property reads from a signal-fed snapshot (default: {False})
     """
-    def __init__(self):
+    def __init__(self, bus=None, cache=False):
+        self._owns_bus = bus is None
         self._bus = Gio.bus_get_sync(
             Gio.BusType.SESSION,
             None
-        )
+        ) if bus is None else bus
 
-        self._proxy = Gio.DBusProxy.new_sync(
-            self._bus,
-            Gio.DBusProxyFlags.NONE,
-            None,
-            "org.mpris.MediaPlayer2.spotify",
-            "/org/mpris/MediaPlayer2",
-            "org.mpris.MediaPlayer2.Player",
-            None
-        )
+        self.round_trips = 0
+        self._properties = None
+        self._signals = []
+
+        if cache:
+            self._signals.append(self._bus.signal_subscribe(
+                BUS_NAME,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                OBJECT_PATH,
+                PLAYER_INTERFACE,
+                Gio.DBusSignalFlags.NONE,
+                self._on_properties_changed,
+                None
+            ))
+            self._signals.append(self._bus.signal_subscribe(
+                "org.freedesktop.DBus",
+                "org.freedesktop.DBus",
+                "NameOwnerChanged",
+                "/org/freedesktop/DBus",
+                BUS_NAME,
+                Gio.DBusSignalFlags.NONE,
+                self._on_name_owner_changed,
+                None
+            ))
+
+    @property
+    def cached(self):
+        return len(self._signals) > 0
 
     def play(self):
         self._call_sync("Play")
@@ -50,46 +174,123 @@ class SpotifyDBus:
         )
 
     def get_metadata(self):
-        metadata = self._call_sync(
-            "org.freedesktop.DBus.Properties.Get",
-            GLib.Variant("(ss)", ("org.mpris.MediaPlayer2.Player", "Metadata"))
+        return create_metadata(self._get_property("Metadata"))
+
+    def get_playback_status(self):
+        return self._get_property("PlaybackStatus")
+
+    def get_properties(self):
+        """Returns all player properties in one round trip, or none if cached
+
+        Returns:
+            dict -- Property names and values, like Metadata and PlaybackStatus
+        """
+        if self._properties is not None:
+            return dict(self._properties)
+
+        properties = self._call_sync(
+            "org.freedesktop.DBus.Properties.GetAll",
+            GLib.Variant("(s)", (PLAYER_INTERFACE,))
         )[0]
+        if self.cached:
+            self._properties = dict(properties)
+        return properties
+
+    def get_properties_async(self, callback=None):
+        """Asynchronous version of get_properties
 
-        return Metadata(
-            metadata["mpris:trackid"],
-            metadata["mpris:length"],
-            metadata["mpris:artUrl"],
-            metadata["xesam:album"],
-            metadata["xesam:albumArtist"],
-            metadata["xesam:artist"],
-            metadata["xesam:autoRating"],
-            metadata["xesam:discNumber"],
-            metadata["xesam:title"],
-            metadata["xesam:trackNumber"],
-            metadata["xesam:url"]
+        Keyword Arguments:
+            callback {function} -- Called with properties and error, see PendingCall (default: {None})
+
+        Returns:
+            PendingCall -- Pending reply
+        """
+        if self._properties is not None:
+            pending = PendingCall(callback=callback)
+            pending._resolve(dict(self._properties))
+            return pending
+
+        return self._call(
+            "org.freedesktop.DBus.Properties.GetAll",
+            GLib.Variant("(s)", (PLAYER_INTERFACE,)),
+            self._store_properties,
+            callback
         )
-        
-    def get_playback_status(self):
-        playback_status = self._call_sync(
+
+    def _get_property(self, name):
+        if self.cached:
+            properties = self.get_properties()
+            if name in properties:
+                return properties[name]
+
+        return self._call_sync(
             "org.freedesktop.DBus.Properties.Get",
-            GLib.Variant("(ss)", ("org.mpris.MediaPlayer2.Player", "PlaybackStatus"))
+            GLib.Variant("(ss)", (PLAYER_INTERFACE, name))
         )[0]
 
-        return playback_status
+    def _store_properties(self, reply):
+        properties = reply[0]
+        if self.cached:
+            self._properties = dict(properties)
+        return properties
+
+    def _on_properties_changed(self, conn, sender_name, obj_path, int_name, sig_name, parameters, user_data):
+        interface_name, changed, invalidated = parameters.unpack()
+        if self._properties is None or not interface_name == PLAYER_INTERFACE:
+            return
+
+        self._properties.update(changed)
+        for name in invalidated:
+            self._properties.pop(name, None)
+
+    def _on_name_owner_changed(self, conn, sender_name, obj_path, int_name, sig_name, parameters, user_data):
+        self._properties = None
+
+    def _split(self, method_name):
+        if "." in method_name:
+            return method_name.rsplit(".", 1)
+        return PLAYER_INTERFACE, method_name
 
     def _call_sync(self, method_name, parameters=None):
+        interface_name, method_name = self._split(method_name)
+        self.round_trips += 1
         try:
-            return self._proxy.call_sync(
+            return self._bus.call_sync(
+                BUS_NAME,
+                OBJECT_PATH,
+                interface_name,
                 method_name,
                 parameters,
+                None,
                 Gio.DBusCallFlags.NONE,
                 -1,
                 None
             )
         except GLib.GError as err:
-            if err.domain == "g-dbus-error-quark" and err.code == 2:
-                raise SpotifyIsNotRunningError()
-            raise err
+            raise _translate_error(err)
+
+    def _call(self, method_name, parameters=None, transform=None, callback=None):
+        interface_name, method_name = self._split(method_name)
+        pending = PendingCall(transform, callback)
+        self.round_trips += 1
+        self._bus.call(
+            BUS_NAME,
+            OBJECT_PATH,
+            interface_name,
+            method_name,
+            parameters,
+            None,
+            Gio.DBusCallFlags.NONE,
+            -1,
+            None,
+            pending._on_reply,
+            None
+        )
+        return pending
 
     def __del__(self):
-        self._bus.close_sync(None)
\ No newline at end of file
+        for signal in self._signals:
+            self._bus.signal_unsubscribe(signal)
+        self._signals = []
+        if self._owns_bus:
+            self._bus.close_sync(None)
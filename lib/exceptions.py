@@ -17,3 +17,19 @@ class PlayerStateServerIsNotRunning(Exception):
 
     def __str__(self):
         return self.message
+
+
+class MalformedFrameError(Exception):
+    message = "malformed data received."
+
+    def __str__(self):
+        return self.message
+
+
+class PlayerControlError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
@@ -1,61 +1,375 @@
 from os import path, makedirs, unlink
-from threading import Thread
-from pickle import loads as to_object, dumps as to_bytes, PickleError
-from .exceptions import PlayerStateServerIsAlreadyRunningError, PlayerStateServerIsNotRunning
+from collections import deque
+from time import monotonic
+from .exceptions import PlayerStateServerIsAlreadyRunningError, PlayerStateServerIsNotRunning, MalformedFrameError, \
+    PlayerControlError
+from .protocol import FrameDecoder, FRAME_PLAYER_STATE, FRAME_PLAYER_STATE_DELTA, FRAME_SUBSCRIBE, FRAME_TEXT, \
+    FRAME_CONTROL, FRAME_CONTROL_RESULT, encode_player_state, encode_player_state_delta, decode_player_state, \
+    apply_player_state_delta, encode_subscription, decode_subscription, encode_text, decode_text, encode_control, \
+    decode_control, encode_control_result, decode_control_result
+import selectors
 import socket
 
 SOCKET_ADDRESS = "/tmp/spotifyctl/socket"
 
 
-class ConnectionAccepterThread(Thread):
-    def __init__(self, sock, connections):
-        super().__init__()
-        self.do_run = True
-        self.sock = sock
-        self.connections = connections
+class _Client:
+    """Connection of a receiver with the bytes not yet written to it
 
-    def run(self):
-        while self.do_run:
+    Pending data are memoryviews of the broadcast buffer; a partial write
+    keeps a slice of it instead of copying the rest. At most one frame waits
+    behind a partially written one: `replace` drops the frames which are not
+    started yet, so a lagging receiver only gets the latest state.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = deque()
+        self.partial = False
+        self.writing = False
+        self.lagging_since = None
+        self.dropped = 0
+        self.coalesced = 0
+        self.decoder = FrameDecoder(256)
+        self.subscription = None
+        self.controlling = False
+
+    def backlogged(self):
+        return len(self.pending) > (1 if self.partial else 0)
+
+    def queue(self, data):
+        self.pending.append(data)
+
+    def replace(self, data):
+        """Queues data in place of the frames not yet started
+
+        Arguments:
+            data {memoryview} -- A frame which does not depend on the dropped ones
+        """
+        keep = 1 if self.partial else 0
+        while len(self.pending) > keep:
+            self.pending.pop()
+            self.dropped += 1
+        self.pending.append(data)
+        self.coalesced += 1
+
+    def lag(self):
+        return 0 if self.lagging_since is None else monotonic() - self.lagging_since
+
+    def flush(self):
+        """Writes pending bytes without blocking
+
+        Returns:
+            bool -- True if everything is written
+        """
+        while self.pending:
+            view = self.pending[0]
             try:
-                connection, address = self.sock.accept()
-                self.connections.append(connection)
-            except socket.timeout:
-                pass
+                sent = self.connection.send(view)
+            except BlockingIOError:
+                sent = 0
+            if sent < len(view):
+                if sent > 0:
+                    self.pending[0] = view[sent:]
+                    self.partial = True
+                if self.lagging_since is None:
+                    self.lagging_since = monotonic()
+                return False
+            self.pending.popleft()
+            self.partial = False
+        self.lagging_since = None
+        return True
 
+    def stats(self):
+        return {
+            "fd": self.connection.fileno(),
+            "pending": sum(len(view) for view in self.pending),
+            "lag": self.lag(),
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
+
+
+class _Subscription:
+    """Receivers sharing a subscription and the last text rendered for them"""
 
-class PlayerStateServer:
     def __init__(self):
-        self.server_address = SOCKET_ADDRESS
+        self.connections = set()
+        self.text = None
+        self.frame = None
+
+
+class PlayerStateServer:
+    """Broadcasts player states to receivers over a UNIX socket
+
+    The server never blocks: connections are accepted and written by
+    `process_events` whenever the socket is ready, and a receiver which does
+    not read keeps its unsent bytes in its own buffer. It is single threaded,
+    drive it from an event loop by calling `process_events` whenever
+    `fileno()` is readable (see `PlayerObserver.add_io_watch`).
+
+    Each state is encoded once per broadcast and all receivers share the
+    same buffer, so `serializations` grows with broadcasts (and keyframes of
+    new receivers), not with the number of receivers.
+
+    Broadcasts are delta frames against the previous state, except every
+    `keyframe_interval`th one and those sent with `keyframe=True`, which
+    carry the full state. A new receiver gets a keyframe of the last state as
+    soon as it connects, so every receiver holds the state the next delta is
+    based on.
+
+    A receiver which does not keep up gets no more than the newest state:
+    frames still queued for it when a new one is broadcast are replaced by a
+    keyframe of it (or, for subscribers, by the newest text). Receivers which
+    stay behind longer than `lag_limit` seconds are disconnected. The kernel
+    send buffer of each receiver is limited to `send_buffer_size` bytes, so
+    stale frames are coalesced here instead of piling up there.
+
+    Connections may send control frames instead, which call the method of
+    `controller` (a `PlayerController`) named by the command. Such a
+    connection gets only the result of its commands, no broadcasts. Without
+    a controller, it is disconnected and should control the player itself.
+
+    Receivers which subscribe with their format string get rendered text
+    instead of player states. `renderer(subscription, player_state)` is
+    called once per distinct subscription and state change, and the text is
+    sent only when it changed. Subscribers of a server without renderer are
+    disconnected, they should render on their own.
+
+    Keyword Arguments:
+        server_address {str} -- Path of the socket, None for SOCKET_ADDRESS (default: {None})
+        keyframe_interval {int} -- Broadcasts between two keyframes (default: {50})
+        lag_limit {float} -- Seconds a receiver may stay behind before it is disconnected (default: {60})
+        send_buffer_size {int} -- Kernel send buffer size of each receiver in bytes (default: {8192})
+        controller {PlayerController} -- Runs control commands (default: {None})
+        renderer {function} -- Renders a player state for a subscription tuple
+                               (format, play indicator, pause indicator,
+                               truncation length) (default: {None})
+    """
+
+    def __init__(self, server_address=None, keyframe_interval=50, renderer=None, lag_limit=60,
+                 send_buffer_size=8192, controller=None):
+        self.server_address = SOCKET_ADDRESS if server_address is None else server_address
+        self.keyframe_interval = keyframe_interval
+        self.renderer = renderer
+        self.lag_limit = lag_limit
+        self.send_buffer_size = send_buffer_size
+        self.controller = controller
+        self.broadcasts = 0
+        self.serializations = 0
+        self.bytes_broadcast = 0
+        self.renders = 0
+        self.lag_disconnects = 0
+        self.commands = 0
 
         self._prepare_filesystem()
 
         self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._sock.settimeout(1)
+        self._sock.setblocking(False)
         self._sock.bind(self.server_address)
-        self._sock.listen(0)
+        self._sock.listen(socket.SOMAXCONN)
+
+        self._clients = dict()
+        self._subscriptions = dict()
+        self._last_state = None
+        self._snapshot = None
+        self._since_keyframe = 0
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ, self._accept)
+
+    def fileno(self):
+        return self._selector.fileno()
+
+    def process_events(self, timeout=0):
+        """Accepts new receivers, writes pending bytes and drops closed connections
 
-        self._connections = list()
+        Keyword Arguments:
+            timeout {float} -- Seconds to wait for an event, None to wait forever (default: {0})
+        """
+        for key, mask in self._selector.select(timeout):
+            key.data(key.fileobj, mask)
 
-        self._thread = ConnectionAccepterThread(self._sock, self._connections)
-        self._thread.start()
+    def send(self, player_state, keyframe=False):
+        if keyframe or self._last_state is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            data = memoryview(encode_player_state(player_state))
+            self._snapshot = data
+            self._since_keyframe = 0
+        else:
+            data = memoryview(encode_player_state_delta(self._last_state, player_state))
+            self._snapshot = None
+            self._since_keyframe += 1
 
-    def send(self, player_state):
-        self._connections[:] = [conn for conn in self._connections if self._send(conn, player_state)]
+        self.serializations += 1
+        self.broadcasts += 1
+        self.bytes_broadcast += len(data)
+        self._last_state = player_state
+
+        for connection, client in list(self._clients.items()):
+            if client.subscription is None and not client.controlling:
+                self._send(connection, data, self._keyframe)
+
+        for subscription in list(self._subscriptions):
+            self._send_text(subscription)
+
+    def client_stats(self):
+        """Returns queue statistics of connected receivers
+
+        Returns:
+            list -- A dict per receiver with its fd, pending bytes, seconds it
+                    is behind, dropped frames and coalesced broadcasts
+        """
+        return [client.stats() for client in self._clients.values()]
 
     def shutdown(self):
+        for connection in list(self._clients):
+            self._disconnect(connection)
+        self._selector.unregister(self._sock)
+        self._selector.close()
         self._sock.close()
         unlink(self.server_address)
 
-    def stop_accepter(self):
-        self._thread.do_run = False
+    def _accept(self, sock, mask):
+        while True:
+            try:
+                connection, address = sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            connection.setblocking(False)
+            if self.send_buffer_size is not None:
+                connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+            self._clients[connection] = _Client(connection)
+            self._selector.register(connection, selectors.EVENT_READ, self._on_client_event)
+            if self._last_state is not None:
+                self._send(connection, self._keyframe())
+
+    def _keyframe(self):
+        if self._snapshot is None:
+            self._snapshot = memoryview(encode_player_state(self._last_state))
+            self.serializations += 1
+        return self._snapshot
+
+    def _on_client_event(self, connection, mask):
+        if mask & selectors.EVENT_READ:
+            decoder = self._clients[connection].decoder
+            try:
+                if decoder.recv_from(connection) == 0:
+                    self._disconnect(connection)
+                    return
+
+                frame = decoder.next_frame()
+                while frame is not None:
+                    frame_type, payload = frame
+                    if frame_type == FRAME_SUBSCRIBE:
+                        self._subscribe(connection, decode_subscription(payload))
+                    elif frame_type == FRAME_CONTROL:
+                        self._control(connection, *decode_control(payload))
+                    if connection not in self._clients:
+                        return
+                    frame = decoder.next_frame()
+            except BlockingIOError:
+                pass
+            except (OSError, MalformedFrameError):
+                self._disconnect(connection)
+                return
+
+        if mask & selectors.EVENT_WRITE:
+            self._flush(connection)
+
+    def _subscribe(self, connection, subscription):
+        client = self._clients[connection]
+        if self.renderer is None or client.subscription is not None or client.controlling:
+            self._disconnect(connection)
+            return
+
+        client.subscription = subscription
+        if subscription in self._subscriptions:
+            entry = self._subscriptions[subscription]
+            entry.connections.add(connection)
+            if entry.frame is not None:
+                self._send(connection, entry.frame)
+        else:
+            self._subscriptions[subscription] = _Subscription()
+            self._subscriptions[subscription].connections.add(connection)
+            self._send_text(subscription)
 
-    def _send(self, connection, player_state):
+    def _control(self, connection, command, argument):
+        client = self._clients[connection]
+        if self.controller is None or client.subscription is not None:
+            self._disconnect(connection)
+            return
+
+        client.controlling = True
         try:
-            data = to_bytes(player_state)
-            connection.send(data)
-            return True
-        except BrokenPipeError:
-            return False
+            method = getattr(self.controller, command)
+            if argument is None:
+                method()
+            else:
+                method(argument)
+            error = ""
+        except Exception as err:
+            error = str(err) or type(err).__name__
+        self.commands += 1
+
+        self._send(connection, memoryview(encode_control_result(error)))
+
+    def _send_text(self, subscription):
+        if self._last_state is None:
+            return
+
+        entry = self._subscriptions[subscription]
+        try:
+            text = self.renderer(subscription, self._last_state)
+            self.renders += 1
+        except Exception:
+            for connection in list(entry.connections):
+                self._disconnect(connection)
+            return
+
+        if text == entry.text:
+            return
+        entry.text = text
+        entry.frame = memoryview(encode_text(text))
+
+        for connection in list(entry.connections):
+            self._send(connection, entry.frame)
+
+    def _send(self, connection, data, keyframe=None):
+        client = self._clients[connection]
+        if not client.pending:
+            client.queue(data)
+            self._flush(connection)
+        elif client.lag() > self.lag_limit:
+            self.lag_disconnects += 1
+            self._disconnect(connection)
+        elif client.backlogged():
+            client.replace(data if keyframe is None else keyframe())
+        else:
+            client.queue(data)
+
+    def _flush(self, connection):
+        client = self._clients[connection]
+        try:
+            done = client.flush()
+        except OSError:
+            self._disconnect(connection)
+            return
+
+        if client.writing == done:
+            client.writing = not done
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE if client.writing else selectors.EVENT_READ
+            self._selector.modify(connection, events, self._on_client_event)
+
+    def _disconnect(self, connection):
+        client = self._clients.pop(connection)
+        self._selector.unregister(connection)
+        connection.close()
+
+        if client.subscription is not None:
+            entry = self._subscriptions[client.subscription]
+            entry.connections.discard(connection)
+            if len(entry.connections) == 0:
+                del self._subscriptions[client.subscription]
 
     def _prepare_filesystem(self):
         server_address_dirname = path.dirname(self.server_address)
@@ -87,9 +401,52 @@ class PlayerStateServer:
             pass
 
 
+def send_control(command, argument=None, server_address=None, timeout=5):
+    """Runs a player command on the connections of a running server
+
+    Arguments:
+        command {str} -- A PlayerController method name, see CONTROL_COMMANDS
+
+    Keyword Arguments:
+        argument {int} -- Argument of volume commands (default: {None})
+        server_address {str} -- Path of the socket, None for SOCKET_ADDRESS (default: {None})
+        timeout {float} -- Seconds to wait for the result (default: {5})
+
+    Raises:
+        PlayerStateServerIsNotRunning -- There is no server which can run commands
+        PlayerControlError -- The command failed on the server
+    """
+    server_address = SOCKET_ADDRESS if server_address is None else server_address
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(server_address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise PlayerStateServerIsNotRunning()
+        sock.sendall(encode_control(command, argument))
+
+        decoder = FrameDecoder(256)
+        while True:
+            if decoder.recv_from(sock) == 0:
+                raise PlayerStateServerIsNotRunning()
+            frame = decoder.next_frame()
+            while frame is not None:
+                frame_type, payload = frame
+                if frame_type == FRAME_CONTROL_RESULT:
+                    error = decode_control_result(payload)
+                    if not error == "":
+                        raise PlayerControlError(error)
+                    return
+                frame = decoder.next_frame()
+    finally:
+        sock.close()
+
+
 class PlayerStateReceiver:
-    def __init__(self):
-        self.server_address = SOCKET_ADDRESS
+    def __init__(self, server_address=None):
+        self.server_address = SOCKET_ADDRESS if server_address is None else server_address
 
         if not path.exists(self.server_address):
             raise PlayerStateServerIsNotRunning()
@@ -100,17 +457,43 @@ class PlayerStateReceiver:
         except ConnectionRefusedError:
             raise PlayerStateServerIsNotRunning()
 
+        self._subscribed = False
+
+    def subscribe(self, format_, play_indicator, pause_indicator, truncation_length):
+        """Asks the server for rendered text instead of player states
+
+        After subscribing, `start` calls back with text lines. A server which
+        cannot render closes the connection.
+        """
+        self._sock.sendall(encode_subscription(format_, play_indicator, pause_indicator, truncation_length))
+        self._subscribed = True
+
     def start(self, callback):
+        decoder = FrameDecoder()
+        player_state = None
+
         while True:
             try:
-                data = self._sock.recv(4096)
-                if not data:
+                if decoder.recv_from(self._sock) == 0:
                     raise PlayerStateServerIsNotRunning()
 
                 try:
-                    player_state = to_object(data)
-                    callback(player_state)
-                except PickleError:
+                    frame = decoder.next_frame()
+                    while frame is not None:
+                        frame_type, payload = frame
+                        if self._subscribed:
+                            if frame_type == FRAME_TEXT:
+                                callback(decode_text(payload))
+                        elif frame_type == FRAME_PLAYER_STATE:
+                            player_state = decode_player_state(payload)
+                            callback(player_state)
+                        elif frame_type == FRAME_PLAYER_STATE_DELTA:
+                            if player_state is None:
+                                raise MalformedFrameError()
+                            player_state = apply_player_state_delta(player_state, payload)
+                            callback(player_state)
+                        frame = decoder.next_frame()
+                except MalformedFrameError:
                     print("error: malformed data received. closing...")
                     break
             except KeyboardInterrupt:
@@ -1,14 +1,38 @@
+from time import monotonic
 from gi.repository import Gio, GLib
-from .pulseaudio import PulseAudioController
-from .playerinfo import PlayerState, Metadata
+from .pulseaudio import PulseAudioController, SinkInputListener
+from .playerinfo import PlayerState
 from .exceptions import SpotifyIsNotRunningError
 
 
+def _schedule(delay, callback):
+    GLib.timeout_add(max(0, round(delay * 1000)), callback)
+
+
 class PlayerController:
-    def __init__(self):
+    """Controls volume through PulseAudio and playback through D-Bus
+
+    With a volume window, relative volume changes are summed for that long
+    and applied with one write from the GLib main loop, which must be
+    running. Errors of those writes are counted, not raised.
+
+    Keyword Arguments:
+        pulseaudio_controller {PulseAudioController} -- Controller to reuse, None to connect (default: {None})
+        dbus_controller {SpotifyDBus} -- Controller to reuse, None to connect (default: {None})
+        volume_window {float} -- Seconds relative volume changes are summed for, 0 to apply each (default: {0})
+    """
+
+    def __init__(self, pulseaudio_controller=None, dbus_controller=None, volume_window=0):
         from .dbus import SpotifyDBus
-        self._pulseaudio_controller = PulseAudioController()
-        self._dbus_controller = SpotifyDBus()
+        self._pulseaudio_controller = PulseAudioController() if pulseaudio_controller is None else pulseaudio_controller
+        self._dbus_controller = SpotifyDBus() if dbus_controller is None else dbus_controller
+        self._volume_accumulator = None
+
+        if volume_window > 0:
+            from .volume import VolumeAccumulator
+            self._volume_accumulator = VolumeAccumulator(
+                self._pulseaudio_controller.increase_volume, volume_window, _schedule
+            )
 
     def mute(self):
         self._pulseaudio_controller.mute()
@@ -20,12 +44,20 @@ class PlayerController:
         return self._pulseaudio_controller.get_volume()
 
     def decrease_volume(self, number):
-        self._pulseaudio_controller.decrease_volume(number)
+        if self._volume_accumulator is not None:
+            self._volume_accumulator.add(-number)
+        else:
+            self._pulseaudio_controller.decrease_volume(number)
 
     def increase_volume(self, number):
-        self._pulseaudio_controller.increase_volume(number)
+        if self._volume_accumulator is not None:
+            self._volume_accumulator.add(number)
+        else:
+            self._pulseaudio_controller.increase_volume(number)
 
     def set_volume(self, volume):
+        if self._volume_accumulator is not None:
+            self._volume_accumulator.discard()
         self._pulseaudio_controller.set_volume(volume)
 
     def mute_unmute(self):
@@ -59,34 +91,89 @@ class PlayerController:
         return self._dbus_controller.get_playback_status()
 
     def get_player_state(self):
+        """Returns the player state
+
+        Properties are fetched with a single D-Bus call, and the volume is
+        queried from PulseAudio while it is in flight.
+
+        Returns:
+            PlayerState -- Player state
+        """
+        from .dbus import create_metadata
+
+        pending = self._dbus_controller.get_properties_async()
+        volume = self.get_volume()
+        properties = pending.result()
+
         return PlayerState(
-            self.get_metadata(),
-            self.get_playback_status(),
-            self.get_volume()
+            create_metadata(properties["Metadata"]),
+            properties["PlaybackStatus"],
+            volume
         )
 
 
 class PlayerObserver:
-    def __init__(self):
+    """Calls back with the player state whenever it changes
+
+    Spotify emits several PropertiesChanged signals for a single change, like
+    a track skip. Signals are coalesced: the state is evaluated once the bus
+    has been quiet for `coalesce_window` seconds, but no later than
+    `max_latency` seconds after the first signal of a burst. A window of 0
+    evaluates every signal immediately.
+
+    With track_volume, volume and mute state of Spotify's sink input are
+    followed through PulseAudio events instead of being queried on every
+    evaluation, and a volume change is reported as soon as it happens, even
+    if Spotify emits no signal for it. If the listener stops, volume is
+    queried again until it is restarted `volume_retry` seconds later.
+
+    Keyword Arguments:
+        coalesce_window {float} -- Quiet period which ends a burst in seconds (default: {0.025})
+        max_latency {float} -- Longest delay of a signal in seconds (default: {0.1})
+        track_volume {bool} -- Follow volume through PulseAudio events (default: {True})
+        volume_retry {float} -- Delay before a stopped volume listener is restarted in seconds (default: {5})
+    """
+
+    def __init__(self, coalesce_window=0.025, max_latency=0.1, track_volume=True, volume_retry=5):
+        from .dbus import SpotifyDBus
         self._bus = Gio.bus_get_sync(
             Gio.BusType.SESSION,
             None
         )
 
+        self._spotify = SpotifyDBus(self._bus, cache=True)
         self._pulseaudio = PulseAudioController()
         self._callback = lambda player_state: print(player_state)
         self._player_state = PlayerState()
 
+        self.coalesce_window = coalesce_window
+        self.max_latency = max_latency
+        self.signals_received = 0
+        self.evaluations = 0
+        self.callbacks = 0
+        self.volume_events = 0
+        self.volume = None
+        self.muted = None
+        self.volume_retry = volume_retry
+
+        self._volume_listener = SinkInputListener(
+            self._on_volume_event, self._on_volume_error
+        ) if track_volume else None
+        self._volume_known = False
+        self._burst_started = None
+        self._evaluation_source = None
+
         self._signal_properties_changed = None
         self._signal_name_owner_changed = None
 
     def start(self):
+        if self._volume_listener is not None:
+            self._volume_listener.start()
         self._subscribe_name_owner_changed_signal()
 
         if self._is_spotify_already_opened():
             self._subscribe_properties_changed_signal()
             self._update_player_state_manually()
-            self._callback(self._player_state)
 
         loop = GLib.MainLoop()
         try:
@@ -100,25 +187,30 @@ class PlayerObserver:
 
         self._callback = callback
 
+    def create_controller(self):
+        """Returns a PlayerController which shares connections of the observer
+
+        It must be used from the thread running the main loop. Relative
+        volume changes are summed for 50ms and written once.
+        """
+        return PlayerController(self._pulseaudio, self._spotify, volume_window=0.05)
+
+    def add_io_watch(self, fd, callback):
+        """Calls callback on the main loop whenever fd is readable
+
+        Arguments:
+            fd {int} -- File descriptor
+            callback {function} -- Function without arguments
+        """
+        def on_readable(fd_, condition):
+            callback()
+            return True
+
+        GLib.unix_fd_add_full(GLib.PRIORITY_DEFAULT, fd, GLib.IOCondition.IN, on_readable)
+
     def _create_player_state(self, metadata, playback_status, volume):
-        state = PlayerState(
-            Metadata(
-                metadata["mpris:trackid"],
-                metadata["mpris:length"],
-                metadata["mpris:artUrl"],
-                metadata["xesam:album"],
-                metadata["xesam:albumArtist"],
-                metadata["xesam:artist"],
-                metadata["xesam:autoRating"],
-                metadata["xesam:discNumber"],
-                metadata["xesam:title"],
-                metadata["xesam:trackNumber"],
-                metadata["xesam:url"]
-            ),
-            playback_status,
-            volume
-        )
-        return state
+        from .dbus import create_metadata
+        return PlayerState(create_metadata(metadata), playback_status, volume)
 
     def _is_spotify_already_opened(self):
         return self._bus.call_sync(
@@ -134,35 +226,22 @@ class PlayerObserver:
         )[0]
 
     def _update_player_state_manually(self):
-        proxy = Gio.DBusProxy.new_sync(
-            self._bus,
-            Gio.DBusProxyFlags.NONE,
-            None,
-            "org.mpris.MediaPlayer2.spotify",
-            "/org/mpris/MediaPlayer2",
-            "org.mpris.MediaPlayer2.Player",
-            None
-        )
-
-        metadata = proxy.call_sync(
-            "org.freedesktop.DBus.Properties.Get",
-            GLib.Variant("(ss)", ("org.mpris.MediaPlayer2.Player", "Metadata")),
-            Gio.DBusCallFlags.NONE,
-            -1,
-            None
-        )[0]
-
-        playback_status = proxy.call_sync(
-            "org.freedesktop.DBus.Properties.Get",
-            GLib.Variant("(ss)", ("org.mpris.MediaPlayer2.Player", "PlaybackStatus")),
-            Gio.DBusCallFlags.NONE,
-            -1,
-            None
-        )[0]
-
-        volume = self._pulseaudio.get_volume()
-
-        self._player_state = self._create_player_state(metadata, playback_status, volume)
+        """Fetches the player state and calls back with it from the main loop
+
+        Properties are requested with one asynchronous call, the volume is
+        queried while it is in flight. The reply is dispatched by the main
+        loop, after this method returns.
+        """
+        def on_properties(properties, error):
+            if error is not None:
+                return
+            self._player_state = self._create_player_state(
+                properties["Metadata"], properties["PlaybackStatus"], volume
+            )
+            self._notify(self._player_state)
+
+        self._spotify.get_properties_async(on_properties)
+        volume = self.volume if self._volume_known else self._pulseaudio.get_volume()
 
     def _on_name_owner_changed(self, conn, sender_name, obj_path, int_name, sig_name, parameters, user_data):
         name = parameters[0]
@@ -176,21 +255,90 @@ class PlayerObserver:
                 self._subscribe_properties_changed_signal()
             elif new_owner == "":
                 self._unsubscribe_properties_changed_signal()
+                self._cancel_evaluation()
                 self._player_state = PlayerState()
-                self._callback(self._player_state)
+                self._notify(self._player_state)
 
     def _on_properties_changed(self, conn, sender_name, obj_path, int_name, sig_name, parameters, user_data):
-        metadata = parameters[1]["Metadata"]
-        playback_status = parameters[1]["PlaybackStatus"]
+        self.signals_received += 1
+
+        if self.coalesce_window <= 0:
+            self._evaluate()
+            return
+
+        now = monotonic()
+        if self._burst_started is None:
+            self._burst_started = now
+        else:
+            GLib.source_remove(self._evaluation_source)
+
+        delay = min(self.coalesce_window, self._burst_started + self.max_latency - now)
+        self._evaluation_source = GLib.timeout_add(max(0, round(delay * 1000)), self._on_burst_end)
+
+    def _on_burst_end(self):
+        self._burst_started = None
+        self._evaluation_source = None
+        self._evaluate()
+        return False
+
+    def _cancel_evaluation(self):
+        if self._evaluation_source is not None:
+            GLib.source_remove(self._evaluation_source)
+        self._burst_started = None
+        self._evaluation_source = None
+
+    def _evaluate(self):
+        self.evaluations += 1
         try:
-            volume = self._pulseaudio.get_volume()
-        except:
-            volume = None
-
-        current_player_state = self._create_player_state(metadata, playback_status, volume)
+            properties = self._spotify.get_properties()
+        except Exception:
+            return
+        if self._volume_known:
+            volume = self.volume
+        else:
+            try:
+                volume = self._pulseaudio.get_volume()
+            except:
+                volume = None
+
+        current_player_state = self._create_player_state(properties["Metadata"], properties["PlaybackStatus"], volume)
         if not current_player_state == self._player_state:
             self._player_state = current_player_state
-            self._callback(self._player_state)
+            self._notify(self._player_state)
+
+    def _on_volume_event(self, volume, muted):
+        GLib.idle_add(self._on_volume_changed, volume, muted)
+
+    def _on_volume_changed(self, volume, muted):
+        self.volume_events += 1
+        self._volume_known = True
+        self.volume = volume
+        self.muted = muted
+        if volume is None:
+            self._pulseaudio.forget_sink_input()
+
+        player_state = self._player_state
+        if not player_state.status == "" and not volume == player_state.volume:
+            self._player_state = PlayerState(player_state.metadata, player_state.status, volume)
+            self._notify(self._player_state)
+        return False
+
+    def _on_volume_error(self, err):
+        GLib.idle_add(self._on_volume_lost)
+
+    def _on_volume_lost(self):
+        self._volume_known = False
+        self._pulseaudio.forget_sink_input()
+        _schedule(self.volume_retry, self._restart_volume_listener)
+        return False
+
+    def _restart_volume_listener(self):
+        self._volume_listener.start()
+        return False
+
+    def _notify(self, player_state):
+        self.callbacks += 1
+        self._callback(player_state)
 
     def _subscribe_name_owner_changed_signal(self):
         self._signal_name_owner_changed = self._bus.signal_subscribe(
@@ -227,6 +375,9 @@ class PlayerObserver:
             self._signal_properties_changed = None
 
     def __del__(self):
+        if self._volume_listener is not None:
+            self._volume_listener.stop()
+        self._cancel_evaluation()
         self._unsubscribe_name_owner_changed_signal()
         self._unsubscribe_properties_changed_signal()
         self._bus.close_sync(None)
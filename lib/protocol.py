@@ -0,0 +1,429 @@
+"""Binary frame format of the player state socket
+
+Every frame starts with a fixed header: protocol version (uint8), frame type
+(uint8) and payload length (uint32), all in network byte order.
+
+A player state payload is a fixed part followed by a text part. The fixed
+part holds a uint16 bitmask of fields which are None, the numeric fields
+(length int64, auto_rating float64, disc_number, track_number and volume
+int32) and the item counts of album_artist and artist (uint16). The text part
+is the UTF-8 encoding of trackid, art_url, album, title, url, status, then
+album artists and artists, separated by NUL. D-Bus strings cannot contain
+NUL, so it never clashes with the content.
+
+A delta payload describes a state by its differences from the previous one:
+a uint16 bitmask of changed fields and a uint16 bitmask of changed fields
+which became None, then the changed numeric fields and item counts of changed
+lists, then the changed strings and list items in the same NUL separated text
+form. Bits are numbered by `_FIELDS`.
+
+A receiver may subscribe to rendered output with a subscription frame, whose
+payload is the format string, play indicator, pause indicator and truncation
+length separated by NUL. The server then sends text frames, each holding a
+rendered line in UTF-8, instead of player states.
+
+A control frame asks the server to run a player command on its connections.
+Its payload is the command name, followed by NUL and the decimal argument
+for volume commands. The server answers with a control result frame whose
+payload is empty on success, otherwise the UTF-8 error message.
+"""
+
+from functools import lru_cache
+from struct import Struct, error as StructError
+
+from .exceptions import MalformedFrameError
+
+VERSION = 1
+HEADER = Struct("!BBI")
+MAX_PAYLOAD_SIZE = 1 << 20
+
+FRAME_PLAYER_STATE = 1
+FRAME_PLAYER_STATE_DELTA = 2
+FRAME_SUBSCRIBE = 3
+FRAME_TEXT = 4
+FRAME_CONTROL = 5
+FRAME_CONTROL_RESULT = 6
+
+CONTROL_COMMANDS = frozenset([
+    "mute", "unmute", "mute_unmute", "set_volume", "increase_volume", "decrease_volume",
+    "play", "pause", "play_pause", "next", "previous"
+])
+
+_FIXED = Struct("!HqdiiiHH")
+_NUMBER_FIELDS = ("length", "auto_rating", "disc_number", "track_number", "volume")
+_NUMBER_FORMATS = "qdiii"
+_TEXT_FIELDS = ("trackid", "art_url", "album", "title", "url", "status")
+_LIST_FIELDS = ("album_artist", "artist")
+_FIELDS = _NUMBER_FIELDS + _TEXT_FIELDS + _LIST_FIELDS
+_LISTS_START = len(_NUMBER_FIELDS) + len(_TEXT_FIELDS)
+
+_DELTA_HEADER = Struct("!HH")
+
+
+def encode_frame(frame_type, payload):
+    return HEADER.pack(VERSION, frame_type, len(payload)) + payload
+
+
+def encode_player_state(player_state):
+    """Encodes a player state as a complete frame
+
+    Arguments:
+        player_state {PlayerState} -- Player state
+
+    Returns:
+        bytes -- Frame
+    """
+    return encode_frame(FRAME_PLAYER_STATE, _encode_payload(player_state))
+
+
+def decode_player_state(payload):
+    """Decodes payload of a player state frame
+
+    Arguments:
+        payload {bytes} -- Payload, without header
+
+    Returns:
+        PlayerState -- Player state
+    """
+    try:
+        nones, length, auto_rating, disc_number, track_number, volume, album_artists, artists = \
+            _FIXED.unpack_from(payload, 0)
+        texts = str(payload[_FIXED.size:], "utf-8").split("\0")
+    except (StructError, UnicodeDecodeError):
+        raise MalformedFrameError()
+
+    if not len(texts) == len(_TEXT_FIELDS) + album_artists + artists:
+        raise MalformedFrameError()
+
+    if nones:
+        numbers = [None if nones & (1 << i) else number for i, number in
+                   enumerate((length, auto_rating, disc_number, track_number, volume))]
+        length, auto_rating, disc_number, track_number, volume = numbers
+        for i in range(len(_TEXT_FIELDS)):
+            if nones & (1 << (len(_NUMBER_FIELDS) + i)):
+                texts[i] = None
+
+    trackid, art_url, album, title, url, status = texts[:6]
+    artists_start = 6 + album_artists
+
+    from .playerinfo import Metadata, PlayerState
+
+    return PlayerState(
+        Metadata(
+            trackid,
+            length,
+            art_url,
+            album,
+            texts[6:artists_start],
+            texts[artists_start:],
+            auto_rating,
+            disc_number,
+            title,
+            track_number,
+            url
+        ),
+        status,
+        volume
+    )
+
+
+def encode_subscription(format_, play_indicator, pause_indicator, truncation_length):
+    """Encodes a subscription to rendered output as a complete frame
+
+    Arguments:
+        format_ {str} -- Format string
+        play_indicator {str} -- Icon shown while playing
+        pause_indicator {str} -- Icon shown when paused
+        truncation_length {int} -- Truncation length
+
+    Returns:
+        bytes -- Frame
+    """
+    fields = (format_, play_indicator, pause_indicator, str(truncation_length))
+    if any("\0" in field for field in fields):
+        raise ValueError("subscription fields cannot contain NUL")
+    return encode_frame(FRAME_SUBSCRIBE, "\0".join(fields).encode("utf-8"))
+
+
+def decode_subscription(payload):
+    """Decodes payload of a subscription frame
+
+    Returns:
+        tuple -- Format string, play indicator, pause indicator and truncation length
+    """
+    try:
+        format_, play_indicator, pause_indicator, truncation_length = str(payload, "utf-8").split("\0")
+        return format_, play_indicator, pause_indicator, int(truncation_length)
+    except (UnicodeDecodeError, ValueError):
+        raise MalformedFrameError()
+
+
+def encode_text(text):
+    return encode_frame(FRAME_TEXT, text.encode("utf-8"))
+
+
+def decode_text(payload):
+    try:
+        return str(payload, "utf-8")
+    except UnicodeDecodeError:
+        raise MalformedFrameError()
+
+
+def encode_control(command, argument=None):
+    """Encodes a player command as a complete frame
+
+    Arguments:
+        command {str} -- One of CONTROL_COMMANDS, a PlayerController method name
+
+    Keyword Arguments:
+        argument {int} -- Argument of volume commands (default: {None})
+
+    Returns:
+        bytes -- Frame
+    """
+    if command not in CONTROL_COMMANDS:
+        raise ValueError("unknown command: " + command)
+    payload = command if argument is None else command + "\0" + str(int(argument))
+    return encode_frame(FRAME_CONTROL, payload.encode("ascii"))
+
+
+def decode_control(payload):
+    """Decodes payload of a control frame
+
+    Returns:
+        tuple -- Command and its argument, None if it has not any
+    """
+    try:
+        parts = str(payload, "ascii").split("\0")
+        if not parts[0] in CONTROL_COMMANDS or len(parts) > 2:
+            raise MalformedFrameError()
+        return parts[0], int(parts[1]) if len(parts) == 2 else None
+    except (UnicodeDecodeError, ValueError):
+        raise MalformedFrameError()
+
+
+def encode_control_result(error=""):
+    return encode_frame(FRAME_CONTROL_RESULT, error.encode("utf-8"))
+
+
+def decode_control_result(payload):
+    return decode_text(payload)
+
+
+def encode_player_state_delta(previous, player_state):
+    """Encodes a player state as a delta frame against the previous one
+
+    Arguments:
+        previous {PlayerState} -- State the receiver already has
+        player_state {PlayerState} -- New state
+
+    Returns:
+        bytes -- Frame
+    """
+    changed = nones = 0
+    numbers = []
+    number_format = "!"
+    counts = []
+    texts = []
+
+    for i, (old, new) in enumerate(zip(_flatten(previous), _flatten(player_state))):
+        if old == new and type(old) is type(new):
+            continue
+
+        changed |= 1 << i
+        if new is None:
+            nones |= 1 << i
+        elif i < len(_NUMBER_FIELDS):
+            number_format += _NUMBER_FORMATS[i]
+            numbers.append(new)
+        elif i < _LISTS_START:
+            texts.append(new)
+        else:
+            counts.append(len(new))
+            texts.extend(new)
+
+    text = "\0".join(texts)
+    if text.count("\0") > max(len(texts) - 1, 0):
+        raise ValueError("player state strings cannot contain NUL")
+
+    payload = (_DELTA_HEADER.pack(changed, nones) +
+               _struct(number_format + "H" * len(counts)).pack(*numbers, *counts) +
+               text.encode("utf-8"))
+    return encode_frame(FRAME_PLAYER_STATE_DELTA, payload)
+
+
+def apply_player_state_delta(previous, payload):
+    """Rebuilds a player state from the previous one and a delta payload
+
+    Arguments:
+        previous {PlayerState} -- State the delta is based on
+        payload {bytes} -- Payload of a delta frame, without header
+
+    Returns:
+        PlayerState -- New state
+    """
+    values = _flatten(previous)
+
+    try:
+        changed, nones = _DELTA_HEADER.unpack_from(payload, 0)
+        present = changed & ~nones
+
+        number_format = "!"
+        for i in range(len(_NUMBER_FIELDS)):
+            if present & (1 << i):
+                number_format += _NUMBER_FORMATS[i]
+        list_count = sum(1 for i in range(_LISTS_START, len(_FIELDS)) if present & (1 << i))
+        fixed = _struct(number_format + "H" * list_count)
+
+        numbers = list(fixed.unpack_from(payload, _DELTA_HEADER.size))
+        text = str(payload[_DELTA_HEADER.size + fixed.size:], "utf-8")
+    except (StructError, UnicodeDecodeError):
+        raise MalformedFrameError()
+
+    counts = numbers[len(numbers) - list_count:]
+    text_count = sum(1 for i in range(len(_NUMBER_FIELDS), _LISTS_START) if present & (1 << i)) + sum(counts)
+    texts = text.split("\0") if text_count > 0 else []
+    if not len(texts) == text_count or (text_count == 0 and not text == ""):
+        raise MalformedFrameError()
+
+    numbers = iter(numbers)
+    texts = iter(texts)
+    counts = iter(counts)
+    for i in range(len(_FIELDS)):
+        if not changed & (1 << i):
+            continue
+        if nones & (1 << i):
+            values[i] = None
+        elif i < len(_NUMBER_FIELDS):
+            values[i] = next(numbers)
+        elif i < _LISTS_START:
+            values[i] = next(texts)
+        else:
+            values[i] = [next(texts) for _ in range(next(counts))]
+
+    return _unflatten(values)
+
+
+@lru_cache(maxsize=256)
+def _struct(format_):
+    return Struct(format_)
+
+
+def _flatten(player_state):
+    metadata = player_state.metadata
+    return [
+        metadata.length, metadata.auto_rating, metadata.disc_number, metadata.track_number, player_state.volume,
+        metadata.trackid, metadata.art_url, metadata.album, metadata.title, metadata.url, player_state.status,
+        metadata.album_artist, metadata.artist
+    ]
+
+
+def _unflatten(values):
+    length, auto_rating, disc_number, track_number, volume, \
+        trackid, art_url, album, title, url, status, album_artist, artist = values
+
+    from .playerinfo import Metadata, PlayerState
+
+    return PlayerState(
+        Metadata(trackid, length, art_url, album, album_artist, artist, auto_rating, disc_number, title,
+                 track_number, url),
+        status,
+        volume
+    )
+
+
+def _encode_payload(player_state):
+    metadata = player_state.metadata
+    numbers = [metadata.length, metadata.auto_rating, metadata.disc_number, metadata.track_number,
+               player_state.volume]
+    texts = [metadata.trackid, metadata.art_url, metadata.album, metadata.title, metadata.url,
+             player_state.status]
+
+    nones = 0
+    for i, value in enumerate(numbers + texts):
+        if value is None:
+            nones |= 1 << i
+    if nones:
+        numbers = [0 if number is None else number for number in numbers]
+        texts = ["" if text is None else text for text in texts]
+
+    album_artists = metadata.album_artist or []
+    artists = metadata.artist or []
+    text = "\0".join(texts + list(album_artists) + list(artists))
+    if text.count("\0") > len(texts) + len(album_artists) + len(artists) - 1:
+        raise ValueError("player state strings cannot contain NUL")
+
+    return _FIXED.pack(nones, *numbers, len(album_artists), len(artists)) + text.encode("utf-8")
+
+
+class FrameDecoder:
+    """Splits a byte stream into frames
+
+    Bytes are received straight into an internal buffer with recv_into, which
+    grows only when a single frame does not fit.
+
+    Keyword Arguments:
+        buffer_size {int} -- Initial size of the buffer (default: {4096})
+    """
+
+    def __init__(self, buffer_size=4096):
+        self._buffer = bytearray(buffer_size)
+        self._start = 0
+        self._end = 0
+
+    def recv_from(self, sock):
+        """Receives available bytes from a socket
+
+        Arguments:
+            sock {socket} -- Socket
+
+        Returns:
+            int -- Number of bytes received, 0 on end of stream
+        """
+        self._make_room()
+        received = sock.recv_into(memoryview(self._buffer)[self._end:])
+        self._end += received
+        return received
+
+    def feed(self, data):
+        self._make_room(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def next_frame(self):
+        """Pops next complete frame
+
+        Returns:
+            tuple -- Frame type and payload, None if no complete frame is buffered
+        """
+        available = self._end - self._start
+        if available < HEADER.size:
+            return None
+
+        version, frame_type, length = HEADER.unpack_from(self._buffer, self._start)
+        if not version == VERSION or length > MAX_PAYLOAD_SIZE:
+            raise MalformedFrameError()
+
+        if available < HEADER.size + length:
+            return None
+
+        payload_start = self._start + HEADER.size
+        self._start = payload_start + length
+        return frame_type, bytes(self._buffer[payload_start:self._start])
+
+    def _make_room(self, size=1):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._start > 0 and len(self._buffer) - self._end < size:
+            pending = self._end - self._start
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start, self._end = 0, pending
+
+        needed = self._end + max(size, self._pending_frame_size() - (self._end - self._start))
+        if needed > len(self._buffer):
+            self._buffer.extend(bytes(needed - len(self._buffer)))
+
+    def _pending_frame_size(self):
+        if self._end - self._start < HEADER.size:
+            return 0
+        return HEADER.size + min(HEADER.unpack_from(self._buffer, self._start)[2], MAX_PAYLOAD_SIZE)
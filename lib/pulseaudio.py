@@ -1,3 +1,4 @@
+from threading import Event, Thread
 import pulsectl
 from .exceptions import SpotifyIsNotRunningError
 
@@ -5,56 +6,99 @@ from .exceptions import SpotifyIsNotRunningError
 def _updatesink(method):
     def new_method(*args):
         self = args[0]
-        
-        self._spotify_sink_input = None
-        for sink_input in self._pulse.sink_input_list():
-            if sink_input.name == "Spotify":
-                self._spotify_sink_input = sink_input
-                break
-
-        if self._spotify_sink_input is None:
-            raise SpotifyIsNotRunningError()
-
+        self._update_sink_input()
         return method(*args)
 
     return new_method
 
 
 class PulseAudioController:
-    def __init__(self):
-        self._pulse = pulsectl.Pulse('spotifyctl')
+    """Controls volume of Spotify's sink input
+
+    The sink input index is cached. Every operation checks it with a single
+    sink_input_info call, and only a miss lists all sink inputs again.
+    `round_trips` counts requests sent to PulseAudio.
+
+    Keyword Arguments:
+        pulse {pulsectl.Pulse} -- Connection to use, None to connect (default: {None})
+    """
+
+    def __init__(self, pulse=None):
+        self._owns_pulse = pulse is None
+        self._pulse = pulsectl.Pulse('spotifyctl') if pulse is None else pulse
         self._spotify_sink_input = None
+        self._spotify_index = None
+        self.round_trips = 0
 
     @_updatesink
     def set_volume(self, volume) -> None:
-        spotify_volume = self._spotify_sink_input.volume
-        spotify_volume.value_flat = self._fix_volume(volume)
-        self._pulse.volume_set(self._spotify_sink_input, spotify_volume)
+        self._set_volume(volume)
 
     @_updatesink
     def get_volume(self):
         try:  # when you open spotify, you should play track to make spotify connect to pulseaudio.
-            return round(self._spotify_sink_input.volume.value_flat * 100)
+            return self._get_volume()
         except SpotifyIsNotRunningError:
             return None
 
     @_updatesink
     def mute(self):
+        self.round_trips += 1
         self._pulse.mute(self._spotify_sink_input, True)
 
     @_updatesink
     def unmute(self):
+        self.round_trips += 1
         self._pulse.mute(self._spotify_sink_input, False)
 
     @_updatesink
     def mute_unmute(self):
+        self.round_trips += 1
         self._pulse.mute(self._spotify_sink_input, self._spotify_sink_input.mute == 0)
 
+    @_updatesink
     def increase_volume(self, number):
-        self.set_volume(self.get_volume() + number)
+        self._set_volume(self._get_volume() + number)
 
+    @_updatesink
     def decrease_volume(self, number):
-        self.set_volume(self.get_volume() - number)
+        self._set_volume(self._get_volume() - number)
+
+    def forget_sink_input(self):
+        """Drops the cached sink input, e.g. when PulseAudio reports its removal"""
+        self._spotify_index = None
+
+    def _get_volume(self):
+        return round(self._spotify_sink_input.volume.value_flat * 100)
+
+    def _set_volume(self, volume):
+        spotify_volume = self._spotify_sink_input.volume
+        spotify_volume.value_flat = self._fix_volume(volume)
+        self.round_trips += 1
+        self._pulse.volume_set(self._spotify_sink_input, spotify_volume)
+
+    def _update_sink_input(self):
+        if self._spotify_index is not None:
+            self.round_trips += 1
+            try:
+                sink_input = self._pulse.sink_input_info(self._spotify_index)
+                if sink_input.name == "Spotify":
+                    self._spotify_sink_input = sink_input
+                    return
+            except pulsectl.PulseIndexError:
+                pass
+
+        self._spotify_sink_input = None
+        self._spotify_index = None
+        self.round_trips += 1
+        for sink_input in self._pulse.sink_input_list():
+            if sink_input.name == "Spotify":
+                self._spotify_sink_input = sink_input
+                self._spotify_index = sink_input.index
+                break
+
+        if self._spotify_sink_input is None:
+            raise SpotifyIsNotRunningError()
 
     def _fix_volume(self, volume):
         return (
@@ -64,4 +108,106 @@ class PulseAudioController:
         ) / 100
 
     def __del__(self):
-        self._pulse.disconnect()
+        if self._owns_pulse:
+            self._pulse.disconnect()
+
+
+class SinkInputListener:
+    """Watches volume and mute state of Spotify's sink input
+
+    PulseAudio sink input events are received in a thread on a dedicated
+    connection, since a connection cannot be used while it listens. The
+    callback is called from that thread with the volume (0-100) and mute
+    state, both None when the sink input is gone, once at start and then
+    whenever they change. When the tracked sink input is removed, another
+    one of Spotify is looked up, since Spotify replaces its sink input e.g.
+    when the output device changes. If listening fails, like when PulseAudio
+    restarts, the thread ends and error_callback is called with the error;
+    start it again to resume.
+
+    Arguments:
+        callback {function} -- Called with volume and mute state
+
+    Keyword Arguments:
+        error_callback {function} -- Called with the error that stopped listening (default: {None})
+        poll_interval {float} -- Seconds between checks of stop requests (default: {1})
+    """
+
+    def __init__(self, callback, error_callback=None, poll_interval=1):
+        self.poll_interval = poll_interval
+        self.events = 0
+
+        self._callback = callback
+        self._error_callback = error_callback
+        self._stopped = Event()
+        self._thread = None
+        self._index = None
+        self._reported = None
+        self._pending = []
+
+    def start(self):
+        self._thread = Thread(target=self._run, name="spotifyctl-pulseaudio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        self._index = None
+        self._reported = None
+        self._pending = []
+        try:
+            self._listen()
+        except Exception as err:
+            if self._error_callback is not None:
+                self._error_callback(err)
+
+    def _listen(self):
+        with pulsectl.Pulse("spotifyctl-events") as pulse:
+            pulse.event_mask_set("sink_input")
+            pulse.event_callback_set(self._on_event)
+            self._find(pulse)
+
+            while not self._stopped.is_set():
+                pulse.event_listen(timeout=self.poll_interval)
+                pending, self._pending = self._pending, []
+                for index, removed in dict(pending).items():
+                    self._update(pulse, index, removed)
+
+    def _find(self, pulse):
+        for sink_input in pulse.sink_input_list():
+            if sink_input.name == "Spotify":
+                self._index = sink_input.index
+                self._report(sink_input)
+                return
+        self._index = None
+        self._report(None)
+
+    def _on_event(self, event):
+        self.events += 1
+        self._pending.append((event.index, event.t == "remove"))
+        raise pulsectl.PulseLoopStop()
+
+    def _update(self, pulse, index, removed):
+        if removed:
+            if index == self._index:
+                self._find(pulse)
+            return
+
+        if not (self._index is None or index == self._index):
+            return
+        try:
+            sink_input = pulse.sink_input_info(index)
+        except pulsectl.PulseIndexError:
+            return
+        if sink_input.name == "Spotify":
+            self._index = index
+            self._report(sink_input)
+
+    def _report(self, sink_input):
+        state = (None, None) if sink_input is None else (
+            round(sink_input.volume.value_flat * 100), not sink_input.mute == 0
+        )
+        if not state == self._reported:
+            self._reported = state
+            self._callback(*state)
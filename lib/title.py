@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
 
-from re import sub as replace
+from re import compile as compile_regex, escape
 from itertools import chain as flatten
+from collections import OrderedDict
+from hashlib import sha256
+import sqlite3
+
+
+_OPENERS = frozenset("([{")
+_CLOSERS = frozenset("}])")
+_DELIMITERS = frozenset("/-")
+_SEPARATOR = compile_regex(r"([ /}\])])")
+_TOKEN = compile_regex(r"[([{/}\])]|[^ ([{/}\])]+")
+_OPENER_IN_WORD = compile_regex(r"[([{](?<=[^ ([{/}\])].)")
+_REMOVE_OPENERS = str.maketrans("", "", "([{")
+_DIGIT_SLASH = compile_regex(r" / (?<=\d / )(?=\d)")
 
 
 def tokenize(text):
     """Simple word tokenizer like nltk.word_tokenize
+
+    Tokens are matched by a compiled regex, so every word is a single slice
+    of text instead of a string built char by char. An opener inside a word
+    is emitted before the word, which continues after it ("a(b" gives "(",
+    "ab"). Texts containing one take the slower split based path.
     
     Arguments:
         text {str} -- A string
@@ -13,25 +31,23 @@ def tokenize(text):
     Returns:
         List -- A list of tokens
     """
+    if _OPENER_IN_WORD.search(text) is None:
+        return _TOKEN.findall(text)
+
     tokenized = []
-    chunk = ""
-
-    for char in text:
-        if char in " ":
-            if not chunk == "":
-                tokenized.append(chunk)
-                chunk = ""
-        elif char in "([{":
-            tokenized.append(char)
-        elif char in "/}])":
-            if not chunk == "":
-                tokenized.append(chunk)            
-            tokenized.append(char)
-            chunk = ""
-        else:
-            chunk += char
-    if not chunk == "":
-        tokenized.append(chunk)
+    pieces = _SEPARATOR.split(text)
+
+    for i in range(0, len(pieces), 2):
+        word = pieces[i]
+        if not word == "":
+            bare = word.translate(_REMOVE_OPENERS)
+            if not len(bare) == len(word):
+                tokenized.extend(char for char in word if char in _OPENERS)
+            if not bare == "":
+                tokenized.append(bare)
+
+        if i + 1 < len(pieces) and not pieces[i + 1] == " ":
+            tokenized.append(pieces[i + 1])
 
     return tokenized
 
@@ -49,19 +65,16 @@ def fractionate(tokenized):
     chunk = []
     
     for token in tokenized:
-        if token in "([{":
+        if token in _OPENERS:
             if not len(chunk) == 0:
                 fractions.append(chunk)
-                chunk = []
-            chunk.append(token)
-        elif token in "/-" and len(chunk) > 0 and not chunk[0] in "([{":
+            chunk = [token]
+        elif token in _DELIMITERS and len(chunk) > 0 and not chunk[0] in _OPENERS:
             fractions.append(chunk)
-            chunk = list()
-            chunk.append(token)
-        elif token in "}])":
+            chunk = [token]
+        elif token in _CLOSERS:
             chunk.append(token)
-            if not len(chunk) == 0:
-                fractions.append(chunk)
+            fractions.append(chunk)
             chunk = []
         else:
             chunk.append(token)
@@ -83,17 +96,71 @@ def defragment(tokenized):
 
     title = ""
     for token in tokenized:
-        if token in "([{":
+        if token in _OPENERS:
             title += token
-        elif token in "}])":
+        elif token in _CLOSERS:
             title = title[:-1] + token + " "
         else:
             title += token + " "
-    return replace(r"(?<=\d)( \/ )(?=\d)", "/", title[:-1])
+    return _DIGIT_SLASH.sub("/", title[:-1])
+
+
+KEYWORDS = frozenset([
+    "album",
+    "alternate",
+    "anniversary",
+    "bonus",
+    "deluxe",
+    "digital",
+    "edition",
+    "from",
+    "live",
+    "mono",
+    "recorded",
+    "remaster",
+    "remastered",
+    "rerecorded",
+    "sessions",
+    "single",
+    "soundtrack",
+    "special",
+    "spotify",
+    "studio",
+    "studios",
+    "sxsw",
+    "unreleased",
+    "version"
+])
+
+PHRASES = (
+    "album version",
+    "intro version",
+    "session version",
+    "hall version",
+    "anniversary version",
+    "recorded at",
+    "recorded in",
+    "recorded live at",
+    "recorded during",
+    "live at",
+    "live from",
+    "spotify session",
+    "jim eno session",
+    "john peel session",
+    "from tokyo disneysea",
+    "lennon legend version",
+    "curated by",
+    "ep version",
+    "саундтрек к компьютерной игре"
+)
+
+_NON_ALPHANUMERIC = compile_regex("[^0-9a-zA-Z]+")
+_NON_ALPHANUMERIC_OR_NUL = compile_regex("[^0-9a-zA-Z\\x00]+")
+_PHRASE_MATCHER = compile_regex("|".join(escape(phrase) for phrase in PHRASES))
 
 
 def distill(text):
-    return replace("[^0-9a-zA-Z]+", "", text).lower()
+    return _NON_ALPHANUMERIC.sub("", text).lower()
 
 
 def is_year(text):
@@ -101,70 +168,25 @@ def is_year(text):
 
 
 def ratio_test(group, threshold):
-    keywords = [
-        "album",
-        "alternate",
-        "anniversary",
-        "bonus",
-        "deluxe",
-        "digital",
-        "edition",
-        "from",
-        "live",
-        "mono",
-        "recorded",
-        "remaster",
-        "remastered",
-        "rerecorded",
-        "sessions",
-        "single",
-        "soundtrack",
-        "special",
-        "spotify",
-        "studio",
-        "studios",
-        "sxsw",
-        "unreleased",
-        "version"
-    ]
-
-    group = list(filter(lambda token: len(token) > 1, group))
+    group = [token for token in group if len(token) > 1]
     if len(group) == 0:
         return 0
-    ratio = len(list(filter(lambda token: distill(token) in keywords or is_year(token), group))) / len(group)
 
-    return ratio < threshold
+    # distill the whole group with one substitution, tokens are joined by NUL
+    distilled = _NON_ALPHANUMERIC_OR_NUL.sub("", "\x00".join(group)).lower().split("\x00")
+    if not len(distilled) == len(group):
+        distilled = [distill(token) for token in group]
+
+    matches = 0
+    for token, word in zip(group, distilled):
+        if word in KEYWORDS or is_year(token):
+            matches += 1
+
+    return matches / len(group) < threshold
 
 
 def phrase_test(group):
-    phrases = [
-        "album version",
-        "intro version",
-        "session version",
-        "hall version",
-        "anniversary version",
-        "recorded at",
-        "recorded in",
-        "recorded live at",
-        "recorded during",
-        "live at",
-        "live from",
-        "spotify session",
-        "jim eno session",
-        "john peel session",
-        "from tokyo disneysea",
-        "lennon legend version",
-        "curated by",
-        "ep version",
-        "саундтрек к компьютерной игре"
-    ]
-
-    joined = " ".join(group).lower()
-
-    for phrase in phrases:
-        if phrase in joined:
-            return False
-    return True
+    return _PHRASE_MATCHER.search(" ".join(group).lower()) is None
 
 
 def clean(title, tests=None):
@@ -183,8 +205,7 @@ def clean(title, tests=None):
     if tests is None:
         tests = [lambda group: ratio_test(group, 0.5), phrase_test]
 
-    tokenized = tokenize(title)
-    grouped = fractionate(tokenized)
+    grouped = fractionate(tokenize(title))
     if len(grouped) == 1:
         return title
     else:
@@ -194,3 +215,116 @@ def clean(title, tests=None):
         flat = list(flatten(*simplified))
         unified = defragment(flat)
         return unified
+
+
+CACHE_VERSION = 1
+DEFAULT_TESTS_KEY = "default-" + sha256(
+    repr((CACHE_VERSION, sorted(KEYWORDS), PHRASES)).encode("utf-8")
+).hexdigest()[:16]
+
+
+class CleanCache:
+    """Memoizes results of clean()
+
+    Results are kept in a bounded LRU and, if a path is given, in a sqlite
+    database so that short-lived processes can reuse each other's results.
+    The database keeps the `store_size` most recently saved titles.
+    Default tests are identified by DEFAULT_TESTS_KEY. Custom tests are only
+    cached when the caller names them with tests_key, since a list of
+    lambdas cannot be identified otherwise.
+
+    Keyword Arguments:
+        maxsize {int} -- Number of titles kept in memory (default: {1024})
+        store_size {int} -- Number of titles kept in the database (default: {65536})
+        path {str} -- Path of the sqlite database, None to keep results only in memory (default: {None})
+    """
+
+    def __init__(self, maxsize=1024, store_size=65536, path=None):
+        self.maxsize = maxsize
+        self.store_size = store_size
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._store = None
+
+        if path is not None:
+            try:
+                self._store = sqlite3.connect(path, timeout=0.1, isolation_level=None)
+                self._store.execute(
+                    "CREATE TABLE IF NOT EXISTS titles "
+                    "(tests TEXT NOT NULL, title TEXT NOT NULL, cleaned TEXT NOT NULL, PRIMARY KEY (tests, title))"
+                )
+            except sqlite3.Error:
+                self._store = None
+
+    def clean(self, title, tests=None, tests_key=None):
+        """Cached version of clean()
+
+        Arguments:
+            title {str} -- Song title
+
+        Keyword Arguments:
+            tests {list} -- List of test functions, see clean() (default: {None})
+            tests_key {str} -- Stable identifier of tests, required to cache custom tests (default: {None})
+
+        Returns:
+            str -- Copy of title without unnecessary parts
+        """
+
+        if tests is None:
+            tests_key = DEFAULT_TESTS_KEY
+        elif tests_key is None:
+            self.misses += 1
+            return clean(title, tests)
+
+        key = (tests_key, title)
+        try:
+            cleaned = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cleaned
+        except KeyError:
+            pass
+
+        cleaned = self._load(key)
+        if cleaned is None:
+            self.misses += 1
+            cleaned = clean(title, tests)
+            self._save(key, cleaned)
+        else:
+            self.store_hits += 1
+
+        self._entries[key] = cleaned
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return cleaned
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.store_hits = self.misses = 0
+
+    def _load(self, key):
+        if self._store is None:
+            return None
+        try:
+            row = self._store.execute("SELECT cleaned FROM titles WHERE tests = ? AND title = ?", key).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else row[0]
+
+    def _save(self, key, cleaned):
+        if self._store is None:
+            return
+        try:
+            rowid = self._store.execute("INSERT OR REPLACE INTO titles VALUES (?, ?, ?)", key + (cleaned,)).lastrowid
+            if rowid > self.store_size:
+                self._store.execute("DELETE FROM titles WHERE rowid <= ?", (rowid - self.store_size,))
+        except sqlite3.Error:
+            pass
+
+    def __del__(self):
+        if getattr(self, "_store", None) is not None:
+            self._store.close()
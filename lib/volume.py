@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+from os import path, makedirs
+from time import sleep
+import fcntl
+
+QUEUE_DIRECTORY = "/tmp/spotifyctl"
+
+
+class VolumeAccumulator:
+    """Sums relative volume changes and applies them with one write
+
+    The first change schedules a flush `window` seconds later, changes made
+    until then are added to it. A flush applies the sum once, so the volume
+    is read, clamped and written once however many changes it holds.
+
+    Arguments:
+        apply {function} -- Applies a relative change, like PulseAudioController.increase_volume
+        window {float} -- Seconds changes are collected for
+        schedule {function} -- Calls its second argument after its first argument seconds
+    """
+
+    def __init__(self, apply, window, schedule):
+        self.window = window
+        self.pending = 0
+        self.changes = 0
+        self.writes = 0
+        self.errors = 0
+
+        self._apply = apply
+        self._schedule = schedule
+        self._scheduled = False
+
+    def add(self, delta):
+        self.pending += delta
+        self.changes += 1
+
+        if not self._scheduled:
+            self._scheduled = True
+            self._schedule(self.window, self.flush)
+
+    def discard(self):
+        self.pending = 0
+
+    def flush(self):
+        self._scheduled = False
+        delta, self.pending = self.pending, 0
+
+        if not delta == 0:
+            self.writes += 1
+            try:
+                self._apply(delta)
+            except Exception:
+                self.errors += 1
+        return False
+
+
+class VolumeQueue:
+    """Sums relative volume changes of concurrent processes
+
+    Every process appends its change to a queue file under a lock and then
+    tries to become the applier. The applier waits `window` seconds, takes
+    all queued changes and applies their sum, until the queue is empty.
+    Other processes return at once, their changes are applied by it. The
+    applier gives up its role while it holds the queue lock, so a change
+    queued after its last look always finds the role free. If applying
+    fails, the sum is queued again before the role is given up, so the next
+    applier applies it with its own changes and no change is lost.
+
+    Keyword Arguments:
+        directory {str} -- Directory of the queue files (default: {QUEUE_DIRECTORY})
+        window {float} -- Seconds changes are collected for (default: {0.05})
+    """
+
+    def __init__(self, directory=QUEUE_DIRECTORY, window=0.05):
+        self.window = window
+        self._queue_path = path.join(directory, "volume.queue")
+        self._applier_path = path.join(directory, "volume.applier")
+
+        if not path.isdir(directory):
+            makedirs(directory, exist_ok=True)
+
+    def push(self, delta, apply):
+        """Queues a change, and applies queued changes if no other process does
+
+        Arguments:
+            delta {int} -- Relative volume change
+            apply {function} -- Applies a relative change, called only by the applier
+
+        Returns:
+            int -- Number of writes done by this process
+        """
+        with self._locked_queue() as queue:
+            queue.seek(0, 2)
+            queue.write("{}\n".format(int(delta)))
+
+        with open(self._applier_path, "a") as applier:
+            try:
+                fcntl.flock(applier, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            writes = 0
+            while True:
+                sleep(self.window)
+                with self._locked_queue() as queue:
+                    queue.seek(0)
+                    deltas = [int(line) for line in queue.read().split()]
+                    queue.truncate(0)
+                    if len(deltas) == 0:
+                        fcntl.flock(applier, fcntl.LOCK_UN)
+                        return writes
+
+                if not sum(deltas) == 0:
+                    try:
+                        apply(sum(deltas))
+                    except Exception:
+                        with self._locked_queue() as queue:
+                            queue.write("{}\n".format(sum(deltas)))
+                            fcntl.flock(applier, fcntl.LOCK_UN)
+                        raise
+                    writes += 1
+
+    @contextmanager
+    def _locked_queue(self):
+        with open(self._queue_path, "a+") as queue:
+            fcntl.flock(queue, fcntl.LOCK_EX)
+            try:
+                yield queue
+            finally:
+                queue.flush()
+                fcntl.flock(queue, fcntl.LOCK_UN)
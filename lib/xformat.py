@@ -1,5 +1,12 @@
 #!/usr/bin/env python3
+from collections.abc import Mapping
+from functools import lru_cache
+from hashlib import sha256
+
 from lark import Lark, Tree
+from lark.exceptions import UnexpectedInput
+
+from .cache import cache_path
 
 GRAMMAR = r"""
 expr            : (WS | ESCAPE | VAR | STRING | group)+
@@ -11,7 +18,7 @@ _GROUP_OPEN     : "{"
 _GROUP_CLOSE    : "}"
 FUNC_NAME       : "@" CNAME
 FUNC_ARG        : _QUOTE _STRING_ESC_INNER _QUOTE
-STRING          : /[^{}| ]+/
+STRING          : /([^{}|$@ ]|\$(?!\$?([a-zA-Z_]|\{[a-zA-Z_]))|@(?!@[a-zA-Z_]))+/
 ESCAPE          : "$" VAR | "@" FUNC_NAME | "{{" | "}}"
 WS              : " "
 _WS             : " "
@@ -23,19 +30,268 @@ _PIPE           : "|"
 """
 
 
+def parser_cache_path():
+    """Returns path of the serialized LALR parser, unique to current grammar"""
+    return cache_path("xformat-" + sha256(GRAMMAR.encode("utf-8")).hexdigest()[:16] + ".lark")
+
+
+class LazyVariables(Mapping):
+    """
+    Variables which are resolved on first access and memoized
+
+    Arguments:
+        resolvers {dict} -- Variable names to functions which take context and return value
+        context -- Argument of resolvers (e.g. a player state)
+    """
+
+    def __init__(self, resolvers, context):
+        self._resolvers = resolvers
+        self._context = context
+        self._values = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = self._resolvers[name](self._context)
+            return value
+
+    def __iter__(self):
+        return iter(self._resolvers)
+
+    def __len__(self):
+        return len(self._resolvers)
+
+
+class Variable:
+    """
+    Reference to a variable in a compiled template
+    """
+
+    __slots__ = ("name", "dependencies")
+
+    def __init__(self, name):
+        self.name = name
+        self.dependencies = frozenset((name,))
+
+    def render(self, variables, functions):
+        return str(variables.get(self.name, ""))
+
+    def _update(self, variables, functions, changed, fragments):
+        return self.render(variables, functions)
+
+
+class Group:
+    """
+    Group of a compiled template with its function pipeline
+
+    Dependencies of a group are the variables used in its parts and string
+    arguments of its functions (e.g. @IfNotNone 'volume'). Functions should
+    not read any other variable, otherwise incremental rendering may reuse a
+    stale fragment.
+    """
+
+    __slots__ = ("parts", "pipeline", "dependencies")
+
+    def __init__(self, parts, pipeline):
+        self.parts = parts
+        self.pipeline = pipeline
+        self.dependencies = _dependencies_of(parts).union(
+            arg for _, args in pipeline for arg in args if isinstance(arg, str)
+        )
+
+    def render(self, variables, functions):
+        return self._apply_pipeline(_render_parts(self.parts, variables, functions), functions)
+
+    def _update(self, variables, functions, changed, fragments):
+        return self._apply_pipeline(_update_parts(self.parts, variables, functions, changed, fragments), functions)
+
+    def _apply_pipeline(self, result, functions):
+        for name, args in self.pipeline:
+            try:
+                func = functions[name]
+            except KeyError:
+                raise Exception("Undefined function: " + name)
+            result = func(result, args)
+
+        return result
+
+
+class Template:
+    """
+    Compiled format string which can be rendered without parsing again
+
+    Templates are shared by every caller of `XFormat.compile` and keep no
+    state of their own. `render` always evaluates the whole template, a
+    renderer made by `renderer` re-renders only what changed.
+    """
+
+    __slots__ = ("source", "parts", "variables")
+
+    def __init__(self, source, parts):
+        self.source = source
+        self.parts = parts
+        self.variables = _dependencies_of(parts)
+
+    def render(self, variables, functions):
+        return _render_parts(self.parts, variables, functions)
+
+    def renderer(self):
+        """Creates a renderer which keeps the previous output of one caller
+
+        Returns:
+            TemplateRenderer -- Renderer of this template
+        """
+        return TemplateRenderer(self)
+
+
+class TemplateRenderer:
+    """
+    Incremental renderer of a template
+
+    `update` remembers the variables and fragments of the previous call and
+    re-renders only groups whose dependencies changed since then. Use one
+    renderer per caller whose functions behave the same on every call,
+    since fragments of one call are reused by the next.
+
+    Arguments:
+        template {Template} -- Template to render
+    """
+
+    __slots__ = ("template", "_last_values", "_fragments", "_output")
+
+    def __init__(self, template):
+        self.template = template
+
+        self._last_values = None
+        self._fragments = {}
+        self._output = None
+
+    def update(self, variables, functions):
+        values = {name: variables.get(name, _MISSING) for name in self.template.variables}
+
+        if self._last_values is None:
+            changed = None
+        else:
+            changed = {name for name, value in values.items() if not value == self._last_values[name]}
+            if len(changed) == 0:
+                return self._output
+
+        self._output = _update_parts(self.template.parts, variables, functions, changed, self._fragments)
+        self._last_values = values
+        return self._output
+
+
+_MISSING = object()
+
+
+def _dependencies_of(parts):
+    return frozenset().union(*(part.dependencies for part in parts if part.__class__ is not str))
+
+
+def _render_parts(parts, variables, functions):
+    return "".join([part if part.__class__ is str else part.render(variables, functions) for part in parts])
+
+
+def _update_parts(parts, variables, functions, changed, fragments):
+    result = []
+    for part in parts:
+        if part.__class__ is str:
+            result.append(part)
+        elif changed is not None and part.dependencies.isdisjoint(changed):
+            result.append(fragments[part])
+        else:
+            fragment = part._update(variables, functions, changed, fragments)
+            fragments[part] = fragment
+            result.append(fragment)
+    return "".join(result)
+
+
 class XFormat:
     """
     Extendet string format
+
+    Keyword Arguments:
+        cache_size {int} -- Number of compiled templates to keep (default: {32})
+        parser {str} -- "earley" builds the parser from scratch, "lalr" loads
+                        parse tables from the user cache directory and builds
+                        them only when the grammar changed. Format strings
+                        LALR cannot parse (e.g. "{a {$b}}", where "}}" is lexed
+                        as an escape) are parsed by Earley. Both render the
+                        same output, since "$" and "@" only start strings
+                        when no variable or escape follows (default: {"earley"})
     """
 
-    def __init__(self):
-        self.grammar = Lark(GRAMMAR, start="expr")
+    def __init__(self, cache_size=32, parser="earley"):
+        self._earley = None
+
+        if parser == "lalr":
+            self.grammar = Lark(GRAMMAR, start="expr", parser="lalr", cache=parser_cache_path())
+        elif parser == "earley":
+            self.grammar = self._earley = Lark(GRAMMAR, start="expr")
+        else:
+            raise ValueError("unknown parser: " + str(parser))
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
 
     def format(self, format_, variables, functions):
-        return self.list_to_str(self.tree_to_list(self.parse(format_), variables, functions))
+        return self.compile(format_).render(variables, functions)
 
     def parse(self, format_):
-        return self.grammar.parse(format_)
+        try:
+            return self.grammar.parse(format_)
+        except UnexpectedInput:
+            if self._earley is None:
+                self._earley = Lark(GRAMMAR, start="expr")
+            elif self._earley is self.grammar:
+                raise
+        return self._earley.parse(format_)
+
+    def _compile(self, format_):
+        """Parses format string once and builds a reusable template
+
+        Compiled templates are cached by format string, see `XFormat.compile`.
+
+        Arguments:
+            format_ {str} -- Format string
+
+        Returns:
+            Template -- Compiled template
+        """
+        return Template(format_, self._compile_children(self.parse(format_))[0])
+
+    def _compile_children(self, tree):
+        parts = []
+        pipeline = []
+
+        for child in tree.children:
+            if isinstance(child, Tree):
+                if child.data == "func_part":
+                    pipeline = [self._compile_func(func) for func in child.children]
+                else:
+                    parts.append(Group(*self._compile_children(child)))
+            elif child.type == "VAR":
+                parts.append(Variable(str(child[2:-1] if child[1] == "{" else child[1:])))
+            elif child.type == "ESCAPE":
+                parts.append(str(child[1:]))
+            else:
+                parts.append(str(child))
+
+        merged = []
+        for part in parts:
+            if isinstance(part, str) and len(merged) > 0 and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+
+        return merged, pipeline
+
+    def _compile_func(self, tree):
+        name = str(tree.children[0])
+        args = []
+        for arg in tree.children[1:]:
+            arg = str(arg[1:-1])
+            args.append(int(arg) if arg.isdigit() else arg)
+        return name, args
 
     def tree_to_list(self, tree, variables, functions):
         return self._tree2list(tree, [], variables, functions)
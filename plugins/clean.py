@@ -0,0 +1,213 @@
+import argparse
+import sys
+from collections import deque
+from itertools import islice
+
+from lib.plugin import SpotifyCtlPlugin
+
+_cache = None
+
+
+class _Lines(list):
+    """List of output lines which can be used as a file by csv.writer"""
+    write = list.append
+
+
+class _BlankLine(str):
+    """Blank ndjson line, written back as it was read"""
+
+
+def _clean_batch(titles):
+    global _cache
+    if _cache is None:
+        from lib.title import CleanCache
+        _cache = CleanCache(maxsize=4096)
+
+    return [_cache.clean(title) if not title.strip() == "" else title for title in titles]
+
+
+class Clean(SpotifyCtlPlugin):
+    def __init__(self, subparsers):
+        subparser = subparsers.add_parser(
+            "clean",
+            help="cleans track titles in bulk"
+        )
+
+        subparser.add_argument(
+            "input",
+            type=str, nargs="?", default="-", metavar="FILE",
+            help="file to read titles from, - for stdin (default: %(default)s)"
+        )
+        subparser.add_argument(
+            "-F", "--input-format",
+            choices=["text", "csv", "ndjson"], default="text", metavar="FORMAT",
+            dest="input_format", help="text (a title per line), csv or ndjson (default: %(default)s)"
+        )
+        subparser.add_argument(
+            "-c", "--column",
+            type=str, default="title", metavar="COLUMN",
+            dest="column", help="csv column name or index, or ndjson field of titles (default: %(default)s)"
+        )
+        subparser.add_argument(
+            "-j", "--jobs",
+            type=self._positive_type, default=None, metavar="N",
+            dest="jobs", help="number of worker processes (default: number of CPUs)"
+        )
+        subparser.add_argument(
+            "--chunk-size",
+            type=self._positive_type, default=1024, metavar="N",
+            dest="chunk_size", help="titles sent to a worker at once (default: %(default)s)"
+        )
+
+        subparser.add_argument(
+            "--debug",
+            action="store_true", dest="debug",
+            help="shows error messages"
+        )
+
+        self._parser = subparser
+        self._output = _Lines()
+
+    def _positive_type(self, number):
+        try:
+            number = int(number)
+        except Exception:
+            raise argparse.ArgumentTypeError("N should be integer.")
+
+        if number < 1:
+            raise argparse.ArgumentTypeError("N should be positive.")
+
+        return number
+
+    def clean_many(self, titles, jobs=None, chunk_size=1024):
+        """Cleans titles in worker processes
+
+        Titles are read lazily and at most two chunks per worker are in flight,
+        so memory stays bounded for inputs of any size.
+
+        Arguments:
+            titles {Iterable} -- Titles
+
+        Keyword Arguments:
+            jobs {int} -- Number of worker processes, 1 cleans in this process (default: {number of CPUs})
+            chunk_size {int} -- Titles sent to a worker at once (default: {1024})
+
+        Yields:
+            str -- Cleaned titles, in input order
+        """
+        titles = iter(titles)
+        chunks = iter(lambda: list(islice(titles, chunk_size)), [])
+
+        if jobs == 1:
+            for chunk in chunks:
+                yield from _clean_batch(chunk)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        from os import cpu_count
+
+        jobs = jobs or cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_clean_batch, chunk))
+                if len(pending) >= jobs * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _read_text(self, stream, args):
+        for line in stream:
+            line = line.rstrip("\r\n")
+            yield line, line
+
+    def _write_text(self, output, record, title):
+        output.write(title + "\n")
+
+    def _read_csv(self, stream, args):
+        import csv
+
+        reader = csv.reader(stream)
+        writer = csv.writer(self._output, lineterminator="\n")
+
+        if args.column.isdigit():
+            column = int(args.column)
+        else:
+            header = next(reader, None)
+            if header is None:
+                return
+            try:
+                column = header.index(args.column)
+            except ValueError:
+                raise Exception("csv column not found: " + args.column)
+            writer.writerow(header)
+
+        self._csv_writer = writer
+        self._csv_column = column
+
+        for row in reader:
+            yield row, row[column] if column < len(row) else ""
+
+    def _write_csv(self, output, record, title):
+        if self._csv_column < len(record):
+            record[self._csv_column] = title
+        self._csv_writer.writerow(record)
+
+    def _read_ndjson(self, stream, args):
+        import json
+
+        self._ndjson_field = args.column
+        self._ndjson_dumps = json.dumps
+
+        for line in stream:
+            if line.strip() == "":
+                yield _BlankLine(line.rstrip("\r\n")), ""
+                continue
+            record = json.loads(line)
+            title = record.get(args.column) if isinstance(record, dict) else None
+            yield record, title if isinstance(title, str) else ""
+
+    def _write_ndjson(self, output, record, title):
+        if isinstance(record, _BlankLine):
+            output.write(record + "\n")
+            return
+        if isinstance(record, dict) and isinstance(record.get(self._ndjson_field), str):
+            record[self._ndjson_field] = title
+        output.write(self._ndjson_dumps(record, ensure_ascii=False) + "\n")
+
+    def run(self, args):
+        read = getattr(self, "_read_" + args.input_format)
+        write = getattr(self, "_write_" + args.input_format)
+
+        try:
+            if args.input == "-":
+                stream = sys.stdin
+                if args.input_format == "csv":
+                    stream.reconfigure(newline="")
+            else:
+                stream = open(args.input, encoding="utf-8", newline="" if args.input_format == "csv" else None)
+
+            with stream:
+                records = deque()
+
+                def titles():
+                    for record, title in read(stream, args):
+                        records.append(record)
+                        yield title
+
+                for title in self.clean_many(titles(), args.jobs, args.chunk_size):
+                    write(self._output, records.popleft(), title)
+                    if len(self._output) >= args.chunk_size:
+                        self._flush()
+                self._flush()
+        except (BrokenPipeError, KeyboardInterrupt):
+            pass
+        except Exception as err:
+            if args.debug:
+                print(err, file=sys.stderr)
+            exit(1)
+
+    def _flush(self):
+        sys.stdout.writelines(self._output)
+        self._output.clear()
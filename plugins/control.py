@@ -86,34 +86,75 @@ class Control(SpotifyCtlPlugin):
 
         return number
 
+    def _command(self, args):
+        if args.mute:
+            return "mute", None
+        elif args.unmute:
+            return "unmute", None
+        elif args.mute_unmute:
+            return "mute_unmute", None
+        elif args.volume is not None:
+            return "set_volume", args.volume
+        elif args.increment_value is not None:
+            return "increase_volume", args.increment_value
+        elif args.decrement_value is not None:
+            return "decrease_volume", args.decrement_value
+        elif args.play:
+            return "play", None
+        elif args.pause:
+            return "pause", None
+        elif args.play_pause:
+            return "play_pause", None
+        elif args.next:
+            return "next", None
+        elif args.previous:
+            return "previous", None
+        return None, None
+
+    def _queue_volume_change(self, delta):
+        """Sums volume changes of concurrent control processes into one write
+
+        Only the process which applies the sum connects to PulseAudio.
+        """
+        from lib.volume import VolumeQueue
+
+        controller = [None]
+
+        def apply(total):
+            if controller[0] is None:
+                from lib.pulseaudio import PulseAudioController
+                controller[0] = PulseAudioController()
+            controller[0].increase_volume(total)
+
+        VolumeQueue().push(delta, apply)
+
     def run(self, args):
+        from lib.exceptions import PlayerStateServerIsNotRunning
+
+        command, argument = self._command(args)
+        if command is None:
+            self._parser.print_usage()
+            return
+
         try:
-            from lib.player import PlayerController
-            player = PlayerController()
-            if args.mute:
-                player.mute()
-            elif args.unmute:
-                player.unmute()
-            elif args.mute_unmute:
-                player.mute_unmute()
-            elif args.volume is not None:
-                player.set_volume(args.volume)
-            elif args.increment_value is not None:
-                player.increase_volume(args.increment_value)
-            elif args.decrement_value is not None:
-                player.decrease_volume(args.decrement_value)
-            elif args.play:
-                player.play()
-            elif args.pause:
-                player.pause()
-            elif args.play_pause:
-                player.play_pause()
-            elif args.next:
-                player.next()
-            elif args.previous:
-                player.previous()
-            else:
-                self._parser.print_usage()
+            from lib.ipc import send_control
+            send_control(command, argument)
+        except PlayerStateServerIsNotRunning:
+            try:
+                if command in ("increase_volume", "decrease_volume"):
+                    self._queue_volume_change(argument if command == "increase_volume" else -argument)
+                    return
+
+                from lib.player import PlayerController
+                player = PlayerController()
+                method = getattr(player, command)
+                if argument is None:
+                    method()
+                else:
+                    method(argument)
+            except Exception as err:
+                if args.debug:
+                    print(err)
         except Exception as err:
             if args.debug:
                 print(err)
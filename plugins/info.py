@@ -1,3 +1,5 @@
+from collections.abc import Mapping
+
 from lib.plugin import SpotifyCtlPlugin
 
 
@@ -41,62 +43,125 @@ class Info(SpotifyCtlPlugin):
         )
 
         self._parser = subparser
+        self._renderers = dict()
+
+    def _create_resolvers(self, clean_title, play_indicator, pause_indicator):
+        return {
+            "trackid": lambda player_state: player_state.metadata.trackid,
+            "length": lambda player_state: player_state.metadata.length,
+            "art_url": lambda player_state: player_state.metadata.art_url,
+            "album": lambda player_state: player_state.metadata.album,
+            "album_artist": lambda player_state: player_state.metadata.album_artist[0],
+            "artist": lambda player_state: player_state.metadata.artist[0],
+            "auto_rating": lambda player_state: player_state.metadata.auto_rating,
+            "disc_number": lambda player_state: player_state.metadata.disc_number,
+            "title": lambda player_state: player_state.metadata.title,
+            "clean_title": lambda player_state: clean_title(player_state.metadata.title),
+            "track_number": lambda player_state: player_state.metadata.track_number,
+            "url": lambda player_state: player_state.metadata.url,
+            "status": lambda player_state: player_state.status,
+            "volume": lambda player_state: player_state.volume,
+            "icon": lambda player_state: (play_indicator if player_state.status == "Playing" else
+                                          pause_indicator if player_state.status == "Paused" else
+                                          "")
+        }
 
-    def _format(self, formatter, clean_title, format_, play_indicator, pause_indicator, player_state):
+    def _format(self, formatter, resolvers, format_, player_state, renderers, key):
         if player_state is None or player_state.status == "" or format_ == "":
             return ""
 
-        functions = {
-            "@IfNotNone": lambda content, args_: "" if variables.get(args_[0], None) is None else content,
-            "@Truncate": lambda content, args_: content[:args_[0]]
-        }
+        from lib.xformat import LazyVariables
 
-        variables = {
-            "trackid": player_state.metadata.trackid,
-            "length": player_state.metadata.length,
-            "art_url": player_state.metadata.art_url,
-            "album": player_state.metadata.album,
-            "album_artist": player_state.metadata.album_artist[0],
-            "artist": player_state.metadata.artist[0],
-            "auto_rating": player_state.metadata.auto_rating,
-            "disc_number": player_state.metadata.disc_number,
-            "title": player_state.metadata.title,
-            "clean_title": clean_title(player_state.metadata.title),
-            "track_number": player_state.metadata.track_number,
-            "url": player_state.metadata.url,
-            "status": player_state.status,
-            "volume": player_state.volume,
-            "icon": (play_indicator if player_state.status == "Playing" else
-                     pause_indicator if player_state.status == "Paused" else
-                     "")
-        }
+        variables = LazyVariables(resolvers, player_state)
+        functions = self._create_functions(lambda: variables)
+
+        if key not in renderers:
+            renderers[key] = formatter.compile(format_).renderer()
+        return renderers[key].update(variables, functions)
 
-        return formatter.format(format_, variables, functions)
+    def format_many(self, formatter, resolvers, format_, player_states):
+        """Renders many player states with one compiled template and function table
 
-    def print_player_state(self, formatter, clean_title, args, player_state):
-        result = self._format(formatter, clean_title, args.format, args.play_indicator, args.pause_indicator, player_state)
+        Arguments:
+            formatter {XFormat} -- Formatter
+            resolvers {dict} -- Variable resolvers, see `_create_resolvers`
+            format_ {str} -- Format string
+            player_states {Iterable} -- Player states or variable dicts
+
+        Yields:
+            str -- Rendered string of each player state, in input order
+        """
+        from lib.xformat import LazyVariables
+
+        current = [None]
+        functions = self._create_functions(lambda: current[0])
+        template = formatter.compile(format_) if not format_ == "" else None
+
+        for player_state in player_states:
+            if isinstance(player_state, Mapping):
+                current[0] = player_state
+            elif template is None or player_state is None or player_state.status == "":
+                yield ""
+                continue
+            else:
+                current[0] = LazyVariables(resolvers, player_state)
+
+            yield template.render(current[0], functions) if template is not None else ""
+
+    def _create_functions(self, variables):
+        return {
+            "@IfNotNone": lambda content, args_: "" if variables().get(args_[0], None) is None else content,
+            "@Truncate": lambda content, args_: content[:args_[0]]
+        }
+
+    def print_player_state(self, formatter, resolvers, args, player_state):
+        result = self._format(formatter, resolvers, args.format, player_state, self._renderers, args.format)
         if not args.format == "":
             print(result)
 
-    def run(self, args):
-        from lib.title import clean as clean_title
+    def _create_renderer(self, formatter, clean_title):
+        resolvers = dict()
+        renderers = dict()
+
+        def render(subscription, player_state):
+            format_, play_indicator, pause_indicator, truncation_length = subscription
+            key = (play_indicator, pause_indicator)
+            if key not in resolvers:
+                resolvers[key] = self._create_resolvers(clean_title, play_indicator, pause_indicator)
+            return self._format(formatter, resolvers[key], format_, player_state, renderers, (format_,) + key)
+
+        return render
+
+    def _create_formatter(self):
+        from lib.cache import cache_path
+        from lib.title import CleanCache
         from lib.xformat import XFormat
+
+        return XFormat(parser="lalr"), CleanCache(path=cache_path("titles.sqlite3")).clean
+
+    def run(self, args):
         from lib.exceptions import PlayerStateServerIsAlreadyRunningError, PlayerStateServerIsNotRunning, SpotifyIsNotRunningError
-        formatter = XFormat()
 
         if args.observe:
             try:
                 from lib.ipc import PlayerStateServer
                 from lib.player import PlayerObserver
 
+                formatter, clean_title = self._create_formatter()
+                resolvers = self._create_resolvers(clean_title, args.play_indicator, args.pause_indicator)
+
                 observer = PlayerObserver()
-                server = PlayerStateServer()
+                server = PlayerStateServer(
+                    renderer=self._create_renderer(formatter, clean_title),
+                    controller=observer.create_controller()
+                )
 
                 def callback(player_state):
-                    self.print_player_state(formatter, clean_title, args, player_state)
+                    self.print_player_state(formatter, resolvers, args, player_state)
                     server.send(player_state)
 
                 observer.set_callback(callback)
+                observer.add_io_watch(server.fileno(), server.process_events)
 
                 observer.start()
             except PlayerStateServerIsAlreadyRunningError as err:
@@ -109,13 +174,17 @@ class Info(SpotifyCtlPlugin):
                 from lib.ipc import PlayerStateReceiver
 
                 receiver = PlayerStateReceiver()
-                receiver.start(lambda player_state: self.print_player_state(formatter, clean_title, args, player_state))
+                receiver.subscribe(args.format, args.play_indicator, args.pause_indicator, args.truncation_length)
+                receiver.start(lambda text: None if args.format == "" else print(text))
             except PlayerStateServerIsNotRunning:
                 from lib.player import PlayerController
 
                 try:
+                    formatter, clean_title = self._create_formatter()
+                    resolvers = self._create_resolvers(clean_title, args.play_indicator, args.pause_indicator)
+
                     player = PlayerController()
-                    self.print_player_state(formatter, clean_title, args, player.get_player_state())
+                    self.print_player_state(formatter, resolvers, args, player.get_player_state())
                 except Exception as err:
                     if args.debug:
                         print(err)
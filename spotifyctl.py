@@ -3,6 +3,7 @@
 import argparse
 import sys
 
+from plugins.clean import Clean
 from plugins.control import Control
 from plugins.info import Info
 
@@ -90,4 +91,5 @@ if __name__ == "__main__":
     app = SpotifyTools()
     app.add_plugin(Info)
     app.add_plugin(Control)
+    app.add_plugin(Clean)
     args = app.launch()